@@ -1,15 +1,36 @@
-import os
+import functools, os
 
-import peewee
+from PyQt5 import QtCore
 
 import wic
+from wic.scheduler import DbTask, scheduler, MAINTENANCE
 
 
 app_dir = os.path.dirname(os.path.abspath(__file__))
 
+# catalog models, relative to `app.catalogs`
+CATALOG_MODELS = (
+    'persons.Person',
+    'locations.Location',
+    'districts.District',
+    'regions.Region',
+    'streets.Street',
+)
+
+
+def sync_indexes(models):
+    """Create the indexes declared by the given models, which are missing in the database.
+
+    Returns:
+        list: the `CREATE INDEX` statements of the created indexes
+    """
+    return [sql for model in models for sql in wic.db.sync_indexes(model)]
+
 
 class MainWindow(wic.main_window.MainWindow):
 
+    _indexesSynced = QtCore.pyqtSignal(object)  # the created indexes or None
+
     def on_system_started(self):
         # predefined function called when the core is ready
         self.statusBar().showMessage('Ready...', 5000)
@@ -18,14 +39,30 @@ class MainWindow(wic.main_window.MainWindow):
             '<><b><span style="color: green">System started.</span> Welcome!</b>', True, False)
         print(f'Application directory: {app_dir}')
 
-        wic.database = peewee.SqliteDatabase('app/databases/mtc.sqlite')
+        wic.database = wic.db.connect('app/databases/mtc.sqlite', **self.settings.database)
         wic.database_proxy.initialize(wic.database)
+        self.sync_indexes()
         # db = orm.SqliteAdapter('papp/databases/mtc.sqlite')
 
         from .reports import phone_number_search
         wic.forms.open_form(phone_number_search.Form)
         #self.mainWindow.restoreSubwindows()
 
+    def sync_indexes(self):
+        """Create the indexes declared by the catalog models, which are missing in the database,
+        in background - it may take a while on big tables.
+        """
+        models = [wic.get_object_by_path(f'app.catalogs.{catalog}') for catalog in CATALOG_MODELS]
+        self._indexesSynced.connect(self.on_indexes_synced)
+        scheduler.submit(
+            DbTask(functools.partial(sync_indexes, models), self._indexesSynced), MAINTENANCE)
+
+    def on_indexes_synced(self, created):
+        if created is None:
+            return  # the failure was logged
+        for sql in created:
+            print(f'Index created: {sql}')
+
     def onSystemAboutToExit(self):
         # a callback before shutdown
         # return False to cancel quitting
@@ -37,14 +74,7 @@ class MainWindow(wic.main_window.MainWindow):
         #Add actions for catalogs.
         # http://docs.python.org/library/pkgutil.html#pkgutil.walk_packages
         menu = self.menu.catalogs
-        catalogs = (
-            'persons.Person',
-            'locations.Location',
-            'districts.District',
-            'regions.Region',
-            'streets.Street',
-        )
-        for catalog in catalogs:
+        for catalog in CATALOG_MODELS:
             model_path = f'app.catalogs.{catalog}'
             wic.menus.add_actions_to_menu(menu,
                 wic.menus.create_action(
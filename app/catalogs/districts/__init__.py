@@ -12,6 +12,13 @@ class District(forms.catalog.CatalogModel):
 
     class Meta:
         table_name = 'districts'
+        indexes = (
+            (('localitate',), False),
+        )
 
 #    def __str__(self):
 #        return self.judet + ' ' + self
+
+
+# the district of a phone number prefix
+District.add_index(District.active_index(District.prefix))
@@ -11,6 +11,9 @@ class Location(forms.catalog.CatalogModel):
 
     class Meta:
         table_name = 'locations'
+        indexes = (
+            (('region', 'location_name'), False),  # the locations of a region by name
+        )
 
     def __str__(self):
         return self.location_name
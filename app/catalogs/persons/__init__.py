@@ -17,6 +17,15 @@ class Person(wic.forms.catalog.CatalogModel):
 
     class Meta:
         table_name = 'persons'
+        indexes = (
+            (('last_name', 'first_name', 'middle_name'), False),  # sorting by name
+        )
 
     def __str__(self):
         return f'{self.last_name} {self.middle_name} {self.first_name}'
+
+
+# ordering and looking up the persons which are not deleted by phone number: the queries must
+# have condition `deleted == False` (see `active_index`); the `phone_number_search` report looks
+# for parts of the numbers (LIKE '%...%'), which no index can serve
+Person.add_index(Person.active_index(Person.phone_number, Person.phone_prefix))
@@ -12,6 +12,9 @@ class Street(forms.catalog.CatalogModel):
 
     class Meta:
         table_name = 'streets'
+        indexes = (
+            (('location', 'street_name'), False),  # the streets of a location by name
+        )
 
     def __str__(self):
         return self.street_name or ''
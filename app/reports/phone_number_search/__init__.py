@@ -1,12 +1,16 @@
-import peewee
-
 from PyQt5 import QtCore, QtGui, QtWidgets
-from wic import forms
+from wic import db, forms
+from wic.scheduler import DbTask, scheduler, REPORT
 
 
 class Form(forms.Form):
 
     _icon_path = ':/icons/fugue/telephone-handset-wire.png'
+    _time_budget = 10  # seconds the search may run
+    _max_results = 100
+
+    # found persons or None - emitted from a worker thread
+    _searchDone = QtCore.pyqtSignal(object)
 
     def on_open(self):
         """Called by the system after it loads the Form.
@@ -17,38 +21,55 @@ class Form(forms.Form):
         self.searchResults.setHorizontalHeaderLabels(['Phone number', 'Name'])
         self.searchResults.resizeColumnsToContents()
         #self.searchResults.setStretchLastSection(True)
+        self._token = None  # of the running search
+        self._searchDone.connect(self.show_results)
+
+    def on_close(self):
+        if self._token is not None:
+            self._token.cancel()
 
     @QtCore.pyqtSlot()
     def on_search_clicked(self):
-        print('Search')
+        if self._token is not None:
+            # the button cancels the running search
+            self._token.cancel()
+            return
         phone_number = self._.phoneNumber.strip()
         last_name = self._.lastName.strip()
         if not phone_number and not last_name:
             self.show_warning('Bad data', 'Enter part of a phone number / last name.')
             return
         from app.catalogs.persons import Person
-        from app import db
-        #print(list(Persons.get(db, where = (Persons.phone_number == phoneNumber), limit = 10, select_related = True)))
-        where = None
+
+        query = Person.select().where(Person.deleted == False)
         if phone_number:
-            where = orm.CONCAT(Person.phone_prefix, Person.phone_number).LIKE('%' + phone_number + '%')
+            query = query.where(
+                Person.phone_prefix.concat(Person.phone_number).contains(phone_number))
         if last_name:
-            where2 = Person.last_name.LIKE('%' + last_name + '%')
-            where = where & where2 if where else where2
-                
-        items = Person.get(db, where = where, limit = 100)
-        
+            query = query.where(Person.last_name.contains(last_name))
+        query = query.limit(self._max_results)
+
+        self._token = db.CancellationToken(
+            Person._meta.database, 'Phone number search', self._time_budget)
+        self.search.setText('Cancel')
+        scheduler.submit(DbTask(lambda: list(query), self._searchDone, token=self._token), REPORT)
+
+    def show_results(self, items):
+        self._token = None
+        self.search.setText('Search')
+        if items is None:
+            self.show_warning(
+                'Search aborted', 'The search was cancelled, took too long or failed.')
+            return
         if not items:
             self.show_information('Nothing found', 'Nothing found')
             return
-        
-        self.searchResults.setRowCount(0)
-        for item in items:
-            rowNo = self.searchResults.row_count()
-            self.searchResults.insertRow(rowNo)
-            self.searchResults.setItem(rowNo, 0, QtWidgets.QTableWidgetItem(
+
+        self.searchResults.setRowCount(len(items))
+        for row_no, item in enumerate(items):
+            self.searchResults.setItem(row_no, 0, QtWidgets.QTableWidgetItem(
                 f'{item.phone_prefix}-{item.phone_number}'))
-            self.searchResults.setItem(rowNo, 1, QtWidgets.QTableWidgetItem(
+            self.searchResults.setItem(row_no, 1, QtWidgets.QTableWidgetItem(
                 f'{item.last_name} {item.first_name} {item.middle_name}'))
-            
+
         self.searchResults.resizeColumnsToContents()
@@ -0,0 +1,116 @@
+"""
+Measure how many `CatalogViewModel.data()` calls per second are served for cached rows, asking
+the roles a view asks when painting a cell. A temporary database is made, so no application
+database is needed, and the offscreen platform is used, no view is shown.
+
+Usage: python bench/catalog_view_data.py [row count] [repeat]
+"""
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import peewee
+from PyQt5 import QtCore, QtWidgets
+
+import wic
+from wic import db
+from wic.forms.catalog import CatalogModel, CatalogViewModel
+
+
+class Region(CatalogModel):
+    name = peewee.CharField()
+
+    class Meta:
+        table_name = 'regions'
+
+    def __str__(self):
+        return self.name
+
+
+class Person(CatalogModel):
+    last_name = peewee.CharField()
+    first_name = peewee.CharField()
+    phone_number = peewee.IntegerField()
+    birth_date = peewee.DateField(null=True)
+    active = peewee.BooleanField(default=True)
+    region = peewee.ForeignKeyField(Region, null=True)
+
+    class Meta:
+        table_name = 'persons'
+        resident = False
+
+
+def fill_database(row_count):
+    wic.database.create_tables([Region, Person])
+    Region.insert_many([(f'Region {i}', False) for i in range(20)],
+                       fields=[Region.name, Region.deleted]).execute()
+    Person.insert_many(
+        [(f'Last{i:05}', f'First{i}', 1000000 + i, datetime.date(1950 + i % 50, 1 + i % 12, 1),
+          i % 3 > 0, 1 + i % 20, False) for i in range(row_count)],
+        fields=[Person.last_name, Person.first_name, Person.phone_number, Person.birth_date,
+                Person.active, Person.region, Person.deleted]).execute()
+
+
+def load_rows(app, view_model, indexes, timeout=10):
+    """Ask the display strings until they stop changing - the pages and the strings of the
+    referenced items are fetched in background.
+    """
+    deadline = time.monotonic() + timeout
+    values = None
+    while time.monotonic() < deadline:
+        app.processEvents()
+        new_values = [view_model.data(index, QtCore.Qt.DisplayRole) for index in indexes]
+        if new_values == values:
+            return
+        values = new_values
+        time.sleep(0.1)
+
+
+def benchmark_data(app, row_count=300, repeat=5):
+    """
+    Returns:
+        float: the best rate of the runs
+    """
+    view_model = CatalogViewModel(Person)
+    Qt = QtCore.Qt
+    roles = (Qt.FontRole, Qt.TextAlignmentRole, Qt.ForegroundRole, Qt.CheckStateRole,
+             Qt.DecorationRole, Qt.DisplayRole, Qt.BackgroundRole, Qt.SizeHintRole)
+    indexes = [view_model.index(row_no, column)
+               for row_no in range(row_count) for column in range(view_model.columnCount(None))]
+    load_rows(app, view_model, indexes)
+    data = view_model.data
+    best_rate = 0
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for index in indexes:
+            for role in roles:
+                data(index, role)
+        best_rate = max(best_rate, len(indexes) * len(roles) / (time.perf_counter() - start_time))
+    return best_rate
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    app = QtWidgets.QApplication(sys.argv[:1])
+    temp_dir = tempfile.mkdtemp()
+    try:
+        wic.database = db.connect(os.path.join(temp_dir, 'bench.sqlite'))
+        wic.database_proxy.initialize(wic.database)
+        fill_database(row_count)
+        rate = benchmark_data(app, row_count, repeat)
+        print(f'{rate:,.0f} data() calls per second')
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        wic.database.close_all()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
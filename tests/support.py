@@ -0,0 +1,51 @@
+"""
+Helpers of the tests which need Qt events and a database used by worker threads.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtCore, QtWidgets
+
+import wic
+from wic import db
+
+
+app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def pump(condition, timeout=5):
+    """Process the events until the condition is true or the time is out.
+
+    Returns:
+        the last value of the condition
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+
+def open_database():
+    """Make the framework database a new file, so the worker threads can use it too.
+
+    Returns:
+        str: the directory of the file, to pass to `close_database`
+    """
+    temp_dir = tempfile.mkdtemp()
+    wic.database = db.connect(os.path.join(temp_dir, 'test.sqlite'))
+    wic.database_proxy.initialize(wic.database)
+    return temp_dir
+
+
+def close_database(temp_dir):
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    # the change feed must not poll the removed file
+    db._change_log_readers.pop(wic.database, None)
+    db._logged_tables.pop(wic.database, None)
+    wic.database.close_all()
+    shutil.rmtree(temp_dir)
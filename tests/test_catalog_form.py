@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+
+import peewee
+from PyQt5 import QtCore, QtTest, QtWidgets
+
+import wic
+from wic.forms.catalog import CatalogModel, CatalogForm
+
+from support import app, pump, open_database, close_database
+
+
+class Contact(CatalogModel):
+    last_name = peewee.CharField()
+    phone_number = peewee.IntegerField()
+
+    class Meta:
+        table_name = 'contacts'
+        resident = False  # the rows are queried, not kept in memory
+
+
+def setUpModule():
+    global temp_dir
+    temp_dir = open_database()
+
+
+def tearDownModule():
+    close_database(temp_dir)
+
+
+class CatalogFormTestCase(unittest.TestCase):
+    """Opens a catalog form of a new database.
+    """
+
+    def setUp(self):
+        wic.database.drop_tables([Contact])
+        wic.database.create_tables([Contact])
+        names = ['Ionescu', 'Munteanu', 'Popescu', 'Rusu']
+        Contact.insert_many(
+            [(f'{names[i % len(names)]}{i:03}', 1000 - i, False) for i in range(400)],
+            fields=[Contact.last_name, Contact.phone_number, Contact.deleted]).execute()
+        self.form = CatalogForm(Contact)
+        self.form.resize(600, 400)
+        self.form.show()
+        self.table_view = self.form.table_view
+        self.view_model = self.table_view.model()
+        field_names = [column.field.name for column in self.view_model.columns]
+        self.name_column = field_names.index('last_name')
+        self.phone_column = field_names.index('phone_number')
+
+    def tearDown(self):
+        self.form.close()
+        self.form.deleteLater()
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+
+
+class TypeAheadTest(CatalogFormTestCase):
+
+    def get_sort_field_names(self):
+        return [field.name for field, _ in self.view_model._order_by]
+
+    def current_text(self):
+        return self.view_model.data(self.table_view.currentIndex(), QtCore.Qt.DisplayRole)
+
+    def test_capital_letter_sorts_by_current_column_only(self):
+        # the rows are ordered by a column which is not a text one
+        self.table_view.sortByColumn(self.phone_column, QtCore.Qt.AscendingOrder)
+        self.assertEqual(self.get_sort_field_names(), ['phone_number', 'id'])
+        self.assertTrue(pump(lambda: self.view_model.item(0) is not None))
+        self.table_view.setCurrentIndex(self.view_model.index(0, self.name_column))
+
+        # Shift is held for the capital letter
+        QtTest.QTest.keyClick(self.table_view, 'P', QtCore.Qt.ShiftModifier)
+        self.assertEqual(self.get_sort_field_names(), ['last_name', 'id'])
+        self.assertTrue(pump(lambda: str(self.current_text()).startswith('Popescu')))
+        self.assertEqual(self.current_text(), 'Popescu002')
+        self.assertEqual(self.table_view.currentIndex().row(), 200)
+        header = self.table_view.horizontalHeader()
+        self.assertEqual(header.sortIndicatorSection(), self.name_column)
+
+
+class ItemActionsTest(CatalogFormTestCase):
+
+    def test_no_item_loaded(self):
+        self.assertTrue(pump(lambda: self.form.current_item() is not None))
+        # the current row is being fetched or was deleted
+        with mock.patch.object(self.view_model, 'item', return_value=None), \
+                mock.patch.object(QtWidgets.QMessageBox, 'question') as question:
+            self.form.edit_item()
+            self.form.delete_item()
+            question.assert_not_called()
+        self.assertEqual(Contact.select().count(), 400)
+
+
+class QuickFilterTest(CatalogFormTestCase):
+
+    def test_without_search_index(self):
+        # e.g. SQLite was built without FTS5
+        with mock.patch('wic.forms.catalog.catalog_view_model.install_search_index',
+                        return_value=False):
+            self.view_model.set_filter('pesc')
+            self.assertTrue(pump(lambda: self.view_model.rowCount(None) == 100))
+        self.assertTrue(pump(lambda: self.view_model.item(0) is not None))
+        self.assertTrue(self.view_model.item(0).last_name.startswith('Popescu'))
+        self.view_model.set_filter('')
+        self.assertTrue(pump(lambda: self.view_model.rowCount(None) == 400))
+
+
+if __name__ == '__main__':
+    unittest.main()
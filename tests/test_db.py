@@ -0,0 +1,277 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import peewee
+from PyQt5 import QtCore
+
+from wic import db
+from wic.db import is_indexed, inline_params, split_conjuncts
+
+
+database = peewee.SqliteDatabase(':memory:')
+
+
+class Person(peewee.Model):
+    deleted = peewee.BooleanField(default=False)
+    last_name = peewee.CharField()
+    first_name = peewee.CharField()
+    phone_number = peewee.IntegerField()
+
+    class Meta:
+        database = database
+        indexes = (
+            (('last_name', 'first_name'), False),
+        )
+
+
+Person.add_index(Person.index(Person.phone_number).where(Person.deleted == False))
+
+
+class Note(peewee.Model):
+    text = peewee.CharField()
+
+    class Meta:
+        database = database
+
+
+class IsIndexedTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        database.connect()
+        database.create_tables([Person])
+
+    @classmethod
+    def tearDownClass(cls):
+        database.close()
+
+    def get_plan(self, query):
+        sql, params = query.sql()
+        return ' '.join(row[-1] for row in database.execute_sql(
+            'EXPLAIN QUERY PLAN ' + sql, params))
+
+    def assert_indexed(self, fields, where, indexed):
+        self.assertEqual(is_indexed(Person, fields, where), indexed)
+        # the check agrees with SQLite
+        query = Person.select().where(where).order_by(*fields).limit(10)
+        self.assertEqual('TEMP B-TREE' not in self.get_plan(query), indexed)
+
+    def test_primary_key_tie_break(self):
+        self.assert_indexed([Person.last_name, Person.first_name, Person.id], None, True)
+        # the rowid goes after all the index columns
+        self.assert_indexed([Person.last_name, Person.id], None, False)
+        self.assert_indexed([Person.last_name], None, True)
+        self.assert_indexed([Person.id], None, True)
+
+    def test_partial_index(self):
+        self.assert_indexed([Person.phone_number, Person.id], None, False)
+        self.assert_indexed([Person.phone_number, Person.id], Person.last_name == 'a', False)
+        self.assert_indexed([Person.phone_number, Person.id], Person.deleted == False, True)
+        self.assertTrue(is_indexed(
+            Person, [Person.phone_number, Person.id],
+            (Person.last_name == 'a') & (Person.deleted == False)))
+        self.assertTrue(is_indexed(
+            Person, [Person.phone_number], '("t1"."deleted" = 0) AND ("t1"."last_name" = \'a\')'))
+
+
+class ChangeLogTest(unittest.TestCase):
+
+    def setUp(self):
+        database.connect()
+        database.create_tables([Note])
+        self.assertTrue(db.install_change_log(Note))
+        self.reader = db._change_log_readers[database]
+
+    def tearDown(self):
+        db._logged_tables.pop(database, None)
+        db._change_log_readers.pop(database, None)
+        database.close()  # the in-memory database is gone
+
+    def add_notes(self, count):
+        Note.insert_many([(str(i),) for i in range(count)], fields=[Note.text]).execute()
+
+    def count_entries(self):
+        return database.execute_sql(f'SELECT count(*) FROM "{db.CHANGE_LOG_TABLE}"').fetchone()[0]
+
+    def test_read(self):
+        self.add_notes(3)
+        Note.delete().where(Note.id == 2).execute()
+        self.assertEqual(self.reader.read(), [(Note, 'insert', [1, 2, 3]), (Note, 'delete', [2])])
+        self.assertEqual(self.reader.read(), [])
+
+    def test_too_many_entries(self):
+        with mock.patch.object(db, 'CHANGE_LOG_MAX_READ', 10):
+            self.add_notes(10)
+            self.assertEqual(len(self.reader.read()[0][2]), 10)
+            self.add_notes(11)
+            # the tables are refreshed instead of reading the entries
+            self.assertEqual(self.reader.read(), [(Note, 'update', None)])
+            self.add_notes(1)
+            self.assertEqual(self.reader.read(), [(Note, 'insert', [22])])
+
+    def test_prune(self):
+        self.add_notes(db.CHANGE_LOG_PRUNE_PERIOD - 10)
+        database.execute_sql(f'UPDATE "{db.CHANGE_LOG_TABLE}" SET "time" = "time" - ?',
+                             (db.CHANGE_LOG_MAX_AGE + 1,))
+        self.add_notes(5)
+        self.assertEqual(self.count_entries(), db.CHANGE_LOG_PRUNE_PERIOD - 5)
+        self.add_notes(5)  # the entry with this number prunes the old ones
+        self.assertEqual(self.count_entries(), 10)
+        # the pruned entries were not read
+        self.assertEqual(self.reader.read(), [(Note, 'update', None)])
+
+
+class ChangeReportingTest(unittest.TestCase):
+
+    def setUp(self):
+        database.connect()
+        database.create_tables([Note])
+        self.changes = []
+        db.add_change_listener(self.on_change)
+
+    def tearDown(self):
+        db.remove_change_listener(self.on_change)
+        database.close()
+
+    def on_change(self, model, operation, record_ids):
+        self.changes.append((model, operation, record_ids))
+
+    def test_insert(self):
+        db.ModelInsert(Note, {Note.text: 'a'}).execute()
+        db.ModelInsert(Note, insert=[('b',), ('c',)], columns=[Note.text]).execute()
+        # the ids of the rows inserted at once are not known
+        self.assertEqual(self.changes, [(Note, 'insert', [1]), (Note, 'insert', None)])
+
+    def test_update(self):
+        db.ModelInsert(Note, insert=[('a',), ('b',)], columns=[Note.text]).execute()
+        del self.changes[:]
+        db.ModelUpdate(Note, {Note.text: 'c'}).where(Note.id == 2).execute()
+        db.ModelUpdate(Note, {Note.text: 'd'}).where(Note.id.in_([1, 2])).execute()
+        db.ModelUpdate(Note, {Note.text: 'e'}).where(Note.id.in_([1, 5])).execute()
+        db.ModelUpdate(Note, {Note.text: 'f'}).where(Note.text == 'e').execute()
+        db.ModelUpdate(Note, {Note.text: 'g'}).where(Note.id == 5).execute()  # nothing changed
+        self.assertEqual(self.changes, [
+            (Note, 'update', [2]), (Note, 'update', [1, 2]),
+            (Note, 'update', None),  # fewer rows matched than the ids
+            (Note, 'update', None)])
+
+    def test_delete(self):
+        db.ModelInsert(Note, insert=[('a',), ('b',), ('c',)], columns=[Note.text]).execute()
+        del self.changes[:]
+        db.ModelDelete(Note).where(Note.id == 1).execute()
+        db.ModelDelete(Note).where(Note.id == 1).execute()  # nothing deleted
+        db.ModelDelete(Note).where(Note.text != '').execute()
+        self.assertEqual(self.changes, [(Note, 'delete', [1]), (Note, 'delete', None)])
+
+
+class ChangeCounterTest(unittest.TestCase):
+
+    def setUp(self):
+        database.connect()
+
+    def tearDown(self):
+        database.close()
+        db._uncounted_tables.clear()
+
+    def test_install_failure(self):
+        # the triggers can't be made without the table
+        with self.assertLogs(level='ERROR') as logs:
+            self.assertIsNone(db.get_change_counter(Note))
+            self.assertIsNone(db.get_change_counter(Note))
+        self.assertEqual(len(logs.records), 1)  # not retried
+
+
+class CancellationTokenTest(unittest.TestCase):
+
+    # counts to a billion, takes minutes
+    long_query = ('WITH RECURSIVE "n"("i") AS (SELECT 1 UNION ALL SELECT "i" + 1 FROM "n" '
+                  'WHERE "i" < 1000000000) SELECT count(*) FROM "n"')
+
+    def setUp(self):
+        database.connect()
+
+    def tearDown(self):
+        database.close()
+
+    def test_cancel_running_query(self):
+        token = db.CancellationToken(database, 'Counting')
+        timer = threading.Timer(0.1, token.cancel)  # e.g. by a cancel button
+        timer.start()
+        start_time = time.monotonic()
+        with self.assertRaisesRegex(db.QueryCancelled, 'Counting: cancelled'):
+            with token:
+                database.execute_sql(self.long_query)
+        timer.join()
+        self.assertLess(time.monotonic() - start_time, 5)
+        # the next queries are not aborted
+        self.assertEqual(database.execute_sql('SELECT 1').fetchone(), (1,))
+
+    def test_time_budget(self):
+        with self.assertRaisesRegex(db.QueryCancelled, 'time budget exceeded'):
+            with db.CancellationToken(database, 'Counting', time_budget=0.1):
+                database.execute_sql(self.long_query)
+
+    def test_cancelled_before_start(self):
+        token = db.CancellationToken(database, 'Counting')
+        token.cancel()
+        with self.assertRaises(db.QueryCancelled):
+            with token:
+                self.fail('The operation must not start')
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'test.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_pool_size(self):
+        # a connection for each worker thread, the GUI thread and a spare
+        database = db.connect(self.path)
+        self.assertEqual(database._max_connections,
+                         QtCore.QThreadPool.globalInstance().maxThreadCount() + 2)
+
+    def test_waiting_for_connection(self):
+        database = db.connect(self.path, max_connections=1, pool_timeout=5)
+        taken = threading.Event()
+
+        def hold_connection():
+            database.execute_sql('SELECT 1')
+            taken.set()
+            time.sleep(0.2)
+            database.release_connection()
+
+        thread = threading.Thread(target=hold_connection)
+        thread.start()
+        taken.wait()
+        # waits for the connection instead of failing
+        self.assertEqual(database.execute_sql('SELECT 2').fetchone(), (2,))
+        thread.join()
+        database.close_all()
+
+
+class ConditionTextTest(unittest.TestCase):
+
+    def test_inline_params(self):
+        self.assertEqual(
+            inline_params("a = ? AND b LIKE '?%' AND c = ? AND d IS ?", [False, "x'y", None]),
+            "a = 0 AND b LIKE '?%' AND c = 'x''y' AND d IS NULL")
+
+    def test_split_conjuncts(self):
+        self.assertEqual(
+            split_conjuncts('(("t1"."deleted" = 0) AND ("t1"."last_name" LIKE \'% and (%\'))'),
+            ['deleted = 0', "last_name like '% and (%'"])
+        self.assertEqual(split_conjuncts('("a" = 1) OR ("b" = 2)'), ['(a = 1) or (b = 2)'])
+        self.assertEqual(split_conjuncts(''), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
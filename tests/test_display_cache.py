@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+import peewee
+
+from wic.forms.catalog.display_cache import RecordDisplayCache
+
+
+database = peewee.SqliteDatabase(':memory:')
+
+
+class Region(peewee.Model):
+    name = peewee.CharField()
+
+    class Meta:
+        database = database
+
+    def __str__(self):
+        return self.name
+
+
+class Person(peewee.Model):
+    region = peewee.ForeignKeyField(Region, null=True)
+
+    class Meta:
+        database = database
+
+
+class RecordDisplayCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        database.connect()
+        database.create_tables([Region, Person])
+        Region.insert_many([(f'region{i}',) for i in range(1, 4)], fields=[Region.name]).execute()
+
+    @classmethod
+    def tearDownClass(cls):
+        database.close()
+
+    def setUp(self):
+        self.cache = RecordDisplayCache()
+        self.foreign_keys = [(1, Person.region)]
+
+    def resolve(self, region_ids):
+        """Resolve the strings of the rows referencing the given regions.
+
+        Returns:
+            int: the number of the queries made
+        """
+        rows = [(i, region_id) for i, region_id in enumerate(region_ids)]
+        with mock.patch.object(Region, 'select', wraps=Region.select) as select:
+            self.cache.resolve(rows, self.foreign_keys)
+        return select.call_count
+
+    def test_resolve(self):
+        self.assertEqual(self.resolve([1, 2, None, 2, 99]), 1)  # one query per page
+        self.assertEqual(self.cache.get(Region, 1), 'region1')
+        self.assertEqual(self.cache.get(Region, 2), 'region2')
+        self.assertIsNone(self.cache.get(Region, 99, 'missing'))  # no such item
+        self.assertIsNone(self.cache.get(Region, None, 'missing'))
+        self.assertEqual(self.cache.get(Region, 3, 'missing'), 'missing')  # not cached
+        self.assertEqual(self.resolve([1, 2, 99]), 0)  # all cached
+        self.assertEqual(self.resolve([1, 3]), 1)
+        self.assertEqual(self.cache.get(Region, 3), 'region3')
+
+    def test_validate(self):
+        self.assertTrue(self.cache.validate(Region, 5))
+        self.resolve([1])
+        self.assertFalse(self.cache.validate(Region, 5))
+        self.assertEqual(self.cache.get(Region, 1), 'region1')
+        # the table was changed since the strings were fetched
+        self.assertTrue(self.cache.validate(Region, 6))
+        self.assertEqual(self.cache.get(Region, 1, 'missing'), 'missing')
+
+    def test_forget_and_invalidate(self):
+        self.resolve([1, 2])
+        self.cache.forget(Region, [1])
+        self.assertEqual(self.cache.get(Region, 1, 'missing'), 'missing')
+        self.assertEqual(self.cache.get(Region, 2), 'region2')
+        self.cache.invalidate(Region)
+        self.assertEqual(self.cache.get(Region, 2, 'missing'), 'missing')
+
+    def test_max_records(self):
+        self.cache.max_records = 2
+        self.resolve([1, 2])
+        self.resolve([3])  # the strings of the model are dropped
+        self.assertEqual(self.cache.get(Region, 1, 'missing'), 'missing')
+        self.assertEqual(self.cache.get(Region, 3), 'region3')
+
+    def test_resolve_resident(self):
+        # the items are looked up in the table kept in memory
+        table = mock.Mock()
+        table.get_item.side_effect = {1: Region(id=1, name='resident1')}.get
+        self.cache.resolve_resident([(0, 1), (1, 1), (2, 99)], [(1, Person.region, table)])
+        self.assertEqual(self.cache.get(Region, 1), 'resident1')
+        self.assertIsNone(self.cache.get(Region, 99, 'missing'))
+        self.assertEqual(table.get_item.call_count, 2)  # once per item
+
+
+if __name__ == '__main__':
+    unittest.main()
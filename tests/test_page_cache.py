@@ -0,0 +1,60 @@
+import unittest
+
+from wic.forms.catalog.page_cache import PageCache
+
+
+def make_page(page_no, size=10):
+    return [(page_no * size + i,) for i in range(size)]
+
+
+class PageCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = PageCache(max_rows=30)
+        for page_no in range(3):
+            cache.put(page_no, make_page(page_no))
+        cache.get(0)  # the page 1 becomes the least recently used
+        cache.put(3, make_page(3))
+        self.assertEqual(cache.pages(), [2, 0, 3])
+        self.assertEqual(cache.row_count, 30)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get(0), make_page(0))
+
+    def test_peek_keeps_order(self):
+        cache = PageCache(max_rows=20)
+        cache.put(0, make_page(0))
+        cache.put(1, make_page(1))
+        self.assertEqual(cache.peek(0), make_page(0))
+        cache.put(2, make_page(2))
+        self.assertEqual(cache.pages(), [1, 2])
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_byte_budget(self):
+        cache = PageCache(max_rows=1000, max_bytes=250, sizeof=lambda rows: 10 * len(rows))
+        for page_no in range(3):
+            cache.put(page_no, make_page(page_no))
+        self.assertEqual(cache.pages(), [1, 2])
+        self.assertEqual(cache.byte_count, 200)
+
+    def test_put_again_replaces_page(self):
+        cache = PageCache(max_rows=30)
+        cache.put(0, make_page(0))
+        cache.put(1, make_page(1))
+        cache.put(0, make_page(0, size=5))
+        self.assertEqual(cache.pages(), [1, 0])
+        self.assertEqual(cache.row_count, 15)
+        self.assertEqual(cache.evictions, 0)
+
+    def test_page_bigger_than_budget_kept(self):
+        # the page which was just put is never evicted
+        cache = PageCache(max_rows=5)
+        cache.put(0, make_page(0))
+        cache.put(1, make_page(1))
+        self.assertEqual(cache.pages(), [1])
+        self.assertEqual(cache.stats(), dict(
+            pages=1, rows=10, bytes=0, hits=0, misses=0, evictions=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
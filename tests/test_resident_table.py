@@ -0,0 +1,137 @@
+import unittest
+from unittest import mock
+
+import peewee
+
+import wic
+from wic.forms.catalog import CatalogModel
+from wic.forms.catalog.display_cache import record_display_cache
+from wic.forms.catalog.resident_table import ResidentTable
+from wic.forms.catalog.row_source import get_catalog_rows
+
+from support import pump, open_database, close_database
+
+
+class Color(CatalogModel):
+    name = peewee.CharField()
+
+    class Meta:
+        table_name = 'colors'
+        resident = True
+
+    def __str__(self):
+        return self.name
+
+
+class Shape(CatalogModel):
+    name = peewee.CharField()
+    color = peewee.ForeignKeyField(Color)
+
+    class Meta:
+        table_name = 'shapes'
+        resident = False
+
+
+def setUpModule():
+    global temp_dir
+    temp_dir = open_database()
+    wic.database.create_tables([Color, Shape])
+
+
+def tearDownModule():
+    close_database(temp_dir)
+
+
+class ResidentTableTest(unittest.TestCase):
+
+    def setUp(self):
+        # not dropping the table - that would drop the change counter triggers
+        Color.delete().execute()
+        Color.insert_many([('red', False), ('green', False)],
+                          fields=[Color.name, Color.deleted]).execute()
+        self.table = ResidentTable(Color)
+
+    def get_names(self):
+        positions = self.table.filter()
+        self.table.sort(positions, [(Color.name, False)])
+        return [self.table.get_item(self.table.columns[0][position]).name
+                for position in positions]
+
+    def test_reload_after_change(self):
+        self.assertTrue(self.table.validate())
+        self.assertEqual(self.get_names(), ['green', 'red'])
+        version = self.table.version
+        with mock.patch.object(Color, 'select', wraps=Color.select) as select:
+            self.assertFalse(self.table.validate())  # the table was not modified
+            select.assert_not_called()
+        self.assertEqual(self.table.version, version)
+
+        Color.create(name='blue', deleted=False)
+        self.assertTrue(self.table.validate())
+        self.assertEqual(self.table.version, version + 1)
+        self.assertEqual(self.get_names(), ['blue', 'green', 'red'])
+        Color.delete().where(Color.name == 'red').execute()
+        self.assertTrue(self.table.validate())
+        self.assertEqual(self.get_names(), ['blue', 'green'])
+        self.assertEqual(len(self.table), 2)
+
+    def test_without_change_counter(self):
+        # e.g. the triggers could not be installed in a read-only database
+        with mock.patch('wic.forms.catalog.resident_table.get_change_counter',
+                        return_value=None):
+            self.assertTrue(self.table.validate())
+            Color.create(name='blue', deleted=False)
+            self.assertFalse(self.table.validate())  # loaded recently
+            self.table.reload_period = 0
+            self.assertTrue(self.table.validate())
+        self.assertEqual(self.get_names(), ['blue', 'green', 'red'])
+
+
+class ResidentRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        Color.delete().execute()
+        Color.insert_many([('red', False), ('green', False)],
+                          fields=[Color.name, Color.deleted]).execute()
+        self.rows = get_catalog_rows(Color, sort_key=[(Color.name, False), (Color.id, False)])
+
+    def tearDown(self):
+        self.rows._release()
+
+    def get_names(self):
+        name_column = Color._meta.sorted_field_names.index('name')
+        return [self.rows.get_row(row_no)[name_column] for row_no in range(self.rows.row_count())]
+
+    def test_validated_on_change(self):
+        self.assertEqual(self.get_names(), ['green', 'red'])
+        # painting the rows doesn't check whether the table was modified
+        with mock.patch('wic.forms.catalog.resident_table.get_change_counter') as counter:
+            self.get_names()
+            self.rows.get_cached_row(0)
+            counter.assert_not_called()
+        Color.create(name='blue', deleted=False)  # the change is reported
+        self.assertTrue(pump(lambda: self.rows.row_count() == 3))
+        self.assertEqual(self.get_names(), ['blue', 'green', 'red'])
+
+    def test_referenced_items_validated_on_change(self):
+        red = Color.get(Color.name == 'red')
+        Shape.delete().execute()
+        Shape.create(name='circle', color=red, deleted=False)
+        rows = get_catalog_rows(Shape)
+        try:
+            self.assertIsNotNone(rows.get_row(0))
+            with mock.patch('wic.forms.catalog.resident_table.get_change_counter') as counter:
+                rows.request_foreign_keys(0)  # the display strings of the colors
+                counter.assert_not_called()
+            self.assertEqual(record_display_cache.get(Color, red.id), 'red')
+            red.name = 'crimson'
+            red.save()  # the change is reported
+            self.assertTrue(pump(lambda: record_display_cache.get(Color, red.id) is None))
+            rows.request_foreign_keys(0)
+            self.assertEqual(record_display_cache.get(Color, red.id), 'crimson')
+        finally:
+            rows._release()
+
+
+if __name__ == '__main__':
+    unittest.main()
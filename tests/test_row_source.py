@@ -0,0 +1,130 @@
+import unittest
+
+import peewee
+
+import wic
+from wic.forms.catalog import CatalogModel
+from wic.forms.catalog.row_source import (
+    make_sort_key, order_clause, seek_condition, get_catalog_rows)
+
+from support import pump, open_database, close_database
+
+
+database = peewee.SqliteDatabase(':memory:')
+
+
+class Person(peewee.Model):
+    last_name = peewee.CharField(index=True)
+    first_name = peewee.CharField()
+    nickname = peewee.CharField(null=True)
+
+    class Meta:
+        database = database
+
+
+class SeekConditionTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        database.connect()
+        database.create_tables([Person])
+        Person.insert_many(
+            [(f'name{i % 300:03}', f'first{i}', None if i % 7 else f'nick{i % 50}')
+             for i in range(3000)],
+            fields=[Person.last_name, Person.first_name, Person.nickname]).execute()
+
+    @classmethod
+    def tearDownClass(cls):
+        database.close()
+
+    def seek(self, order_by, forward=True):
+        """Make the query of the rows going after (or before) the 1000th row in the given order.
+        """
+        sort_key = make_sort_key(Person, order_by)
+        ordered = Person.select().order_by(*order_clause(sort_key)).tuples()
+        rows = list(ordered)
+        field_names = Person._meta.sorted_field_names
+        key_values = [rows[1000][field_names.index(field.name)] for field, _ in sort_key]
+        query = Person.select().where(seek_condition(sort_key, key_values, forward)) \
+            .order_by(*order_clause(sort_key, reverse=not forward)).limit(50)
+        expected = rows[1001:1051] if forward else rows[950:1000][::-1]
+        self.assertEqual(list(query.tuples()), expected)
+        return query
+
+    def get_plan(self, query):
+        sql, params = query.sql()
+        return ' '.join(row[-1] for row in database.execute_sql(
+            'EXPLAIN QUERY PLAN ' + sql, params))
+
+    def test_row_value_seek_searches_index(self):
+        for order_by in ([Person.last_name], [Person.last_name.desc()]):
+            for forward in (True, False):
+                plan = self.get_plan(self.seek(order_by, forward))
+                self.assertIn('SEARCH', plan, (order_by, forward))
+                self.assertNotIn('TEMP B-TREE', plan, (order_by, forward))
+
+    def test_expanded_seek(self):
+        # mixed directions and nullable fields can't be compared as row values
+        for order_by in ([Person.last_name, Person.first_name.desc()],
+                         [Person.nickname], [Person.nickname.desc()]):
+            for forward in (True, False):
+                self.seek(order_by, forward)
+
+
+class Item(CatalogModel):
+    name = peewee.CharField()
+
+    class Meta:
+        table_name = 'items'
+        resident = False
+
+
+class CatalogRowsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = open_database()
+
+    @classmethod
+    def tearDownClass(cls):
+        close_database(cls.temp_dir)
+
+    def setUp(self):
+        wic.database.drop_tables([Item])
+        wic.database.create_tables([Item])
+        Item.insert_many([(f'item{i}', False) for i in range(1000)],
+                         fields=[Item.name, Item.deleted]).execute()
+        self.rows = get_catalog_rows(Item)
+        self.rows.row_count()
+        self.assertTrue(pump(self.rows.is_row_count_exact))
+
+    def tearDown(self):
+        self.rows._release()
+
+    def get_last_page(self):
+        row_count = self.rows.row_count()
+        first_row = (row_count - 1) // self.rows._page_size * self.rows._page_size
+        return [self.rows.get_cached_row(row_no) for row_no in range(first_row, row_count)]
+
+    def assert_last_page(self):
+        """Check the last page, waiting until it is fetched again.
+        """
+        expected = list(Item.select().order_by(Item.id).tuples())
+        pump(lambda: self.get_last_page() == expected[-len(self.get_last_page()):])
+        page = self.get_last_page()
+        self.assertEqual(page, expected[-len(page):])
+
+    def test_last_page_after_insert_and_delete(self):
+        # only the last page is cached, so it is fetched counting from the end
+        self.rows.get_row(self.rows.row_count() - 1)
+        self.assert_last_page()
+        Item.create(name='new', deleted=False)
+        self.assertTrue(pump(lambda: self.rows.row_count() == 1001))
+        self.assert_last_page()
+        Item.get(Item.name == 'item990').delete_instance()
+        self.assertTrue(pump(lambda: self.rows.row_count() == 1000))
+        self.assert_last_page()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import unittest
+
+from PyQt5 import QtCore
+
+from wic.scheduler import DbScheduler, DbTask, VISIBLE, SELECTION, PREFETCH, COUNT
+
+from support import pump
+
+
+class Receiver(QtCore.QObject):
+    done = QtCore.pyqtSignal(object, object)  # task name, result
+
+    def __init__(self):
+        super().__init__()
+        self.results = {}
+        self.done.connect(self.results.__setitem__)
+
+
+class DbSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thread_pool = QtCore.QThreadPool()
+        self.receiver = Receiver()
+        self.started = []  # names of the tasks in the order they were started
+        self.gates = {}  # {task name: event which lets the task finish}
+
+    def tearDown(self):
+        for gate in self.gates.values():
+            gate.set()
+        self.thread_pool.waitForDone()
+
+    def make_scheduler(self, max_threads, limits=None):
+        self.thread_pool.setMaxThreadCount(max_threads)
+        return DbScheduler(self.thread_pool, limits)
+
+    def submit(self, scheduler, name, priority, is_needed=None):
+        """Submit a task, which runs until its gate is opened.
+        """
+        gate = self.gates[name] = threading.Event()
+
+        def function():
+            self.started.append(name)
+            gate.wait(5)
+            return name
+
+        return scheduler.submit(DbTask(function, self.receiver.done, name), priority, is_needed)
+
+    def finish(self, *names):
+        for name in names:
+            self.gates[name].set()
+        self.assertTrue(pump(lambda: all(name in self.receiver.results for name in names)))
+
+    def test_priority_order(self):
+        scheduler = self.make_scheduler(1)
+        self.submit(scheduler, 'busy', VISIBLE)
+        self.assertTrue(pump(lambda: self.started == ['busy']))
+        for name, priority in (('count', COUNT), ('prefetch', PREFETCH), ('visible', VISIBLE),
+                               ('selection', SELECTION)):
+            self.submit(scheduler, name, priority)
+        for gate in self.gates.values():
+            gate.set()
+        self.assertTrue(pump(lambda: len(self.receiver.results) == 5))
+        self.assertEqual(self.started, ['busy', 'visible', 'selection', 'prefetch', 'count'])
+
+    def test_class_limit(self):
+        scheduler = self.make_scheduler(4, limits={COUNT: 1})
+        for name in ('count1', 'count2'):
+            self.submit(scheduler, name, COUNT)
+        self.submit(scheduler, 'visible', VISIBLE)
+        self.assertTrue(pump(lambda: len(self.started) == 2))
+        self.assertEqual(sorted(self.started), ['count1', 'visible'])
+        self.assertEqual(scheduler.stats()['count']['queued'], 1)
+        self.finish('count1')
+        self.assertTrue(pump(lambda: 'count2' in self.started))
+
+    def test_reserved_thread(self):
+        # the background work does not take the last thread
+        scheduler = self.make_scheduler(2, limits={PREFETCH: None})
+        for name in ('prefetch1', 'prefetch2'):
+            self.submit(scheduler, name, PREFETCH)
+        self.assertTrue(pump(lambda: self.started == ['prefetch1']))
+        self.submit(scheduler, 'visible', VISIBLE)
+        self.assertTrue(pump(lambda: self.started == ['prefetch1', 'visible']))
+        self.finish('visible')
+        self.assertEqual(self.started, ['prefetch1', 'visible'])
+        self.finish('prefetch1')
+        self.assertTrue(pump(lambda: 'prefetch2' in self.started))
+
+    def test_promote(self):
+        scheduler = self.make_scheduler(1)
+        self.submit(scheduler, 'busy', VISIBLE)
+        self.submit(scheduler, 'prefetch1', PREFETCH)
+        request = self.submit(scheduler, 'prefetch2', PREFETCH)
+        scheduler.promote(request, VISIBLE)  # e.g. the page became visible
+        self.assertEqual(request.priority, VISIBLE)
+        for gate in self.gates.values():
+            gate.set()
+        self.assertTrue(pump(lambda: len(self.receiver.results) == 3))
+        self.assertEqual(self.started, ['busy', 'prefetch2', 'prefetch1'])
+
+    def test_drop(self):
+        scheduler = self.make_scheduler(1)
+        self.submit(scheduler, 'busy', VISIBLE)
+        needed = True
+        self.submit(scheduler, 'superseded', PREFETCH, lambda: needed)
+        cancelled = self.submit(scheduler, 'cancelled', PREFETCH)
+        needed = False  # e.g. the page was scrolled out of view
+        cancelled.cancel()
+        self.finish('busy')
+        # the dropped tasks report no result without running
+        self.assertTrue(pump(lambda: len(self.receiver.results) == 3))
+        self.assertEqual(self.receiver.results, dict(busy='busy', superseded=None, cancelled=None))
+        self.assertEqual(self.started, ['busy'])
+        self.assertEqual(scheduler.stats()['prefetch']['dropped'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from PyQt5 import QtCore
+
+from wic.settings import read_database_settings
+
+
+class DatabaseSettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def round_trip(self, values):
+        """Save the values to the INI file and read them back. They are saved by another process,
+        as QSettings of this one would give the values it cached instead of reading the file.
+        """
+        path = os.path.join(self.temp_dir, f'settings{len(os.listdir(self.temp_dir))}.ini')
+        subprocess.run([sys.executable, '-c', (
+            'import sys\n'
+            'from PyQt5 import QtCore\n'
+            'settings = QtCore.QSettings(sys.argv[1], QtCore.QSettings.IniFormat)\n'
+            'for key, value in eval(sys.argv[2]).items():\n'
+            '    settings.setValue(f"database/{key}", value)\n'
+            'settings.sync()\n'), path, repr(values)], check=True)
+        return read_database_settings(QtCore.QSettings(path, QtCore.QSettings.IniFormat))
+
+    def test_round_trip(self):
+        self.assertEqual(self.round_trip(dict(trace_queries=False)), dict(trace_queries=False))
+        self.assertEqual(self.round_trip(dict(trace_queries=True)), dict(trace_queries=True))
+        self.assertEqual(
+            self.round_trip(dict(slow_query_ms=250, journal_mode='wal')),
+            dict(slow_query_ms=250, journal_mode='wal'))
+
+    def test_missing_settings(self):
+        self.assertEqual(self.round_trip({}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
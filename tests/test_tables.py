@@ -0,0 +1,27 @@
+import unittest
+from decimal import Decimal
+
+from PyQt5 import QtCore
+
+from wic.tables import Table, TableModel
+
+
+class TableModelTest(unittest.TestCase):
+
+    def test_display_strings(self):
+        table = Table()
+        column = table.new_column('price', format='.2f', default=Decimal(0))
+        row = table.new_row()
+        row.price = Decimal('1.5')
+        model = TableModel(table)
+        index = model.index(0, 0)
+        self.assertEqual(model.data(index, QtCore.Qt.DisplayRole), '1.50')
+        row.price = Decimal('2')
+        self.assertEqual(model.data(index, QtCore.Qt.DisplayRole), '2.00')
+        # the cached strings are not shown after the column format is changed
+        column.row_item.format = '.3f'
+        self.assertEqual(model.data(index, QtCore.Qt.DisplayRole), '2.000')
+
+
+if __name__ == '__main__':
+    unittest.main()
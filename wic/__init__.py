@@ -11,10 +11,10 @@ import peewee
 
 logging.basicConfig(level=logging.INFO)
 
-REQUIRED_PYTHON_VERSION = '3.9'  # tested with this version or later
-if sys.version < REQUIRED_PYTHON_VERSION:
+REQUIRED_PYTHON_VERSION = (3, 9)  # tested with this version or later
+if sys.version_info < REQUIRED_PYTHON_VERSION:
     raise SystemExit('Python %s or newer required (you are using: %s).'
-                     % (REQUIRED_PYTHON_VERSION, sys.version))
+                     % ('.'.join(map(str, REQUIRED_PYTHON_VERSION)), sys.version))
 
 try:  # load Qt resources (icons, etc.)
     from .widgets import widgets_rc
@@ -37,7 +37,12 @@ database = None
 database_proxy = peewee.DatabaseProxy()
 
 
-from . import forms, menus, widgets, main_window, app
+from . import db, forms, menus, widgets, main_window, app
+
+__all__ = [
+    'REQUIRED_PYTHON_VERSION', 'Bunch', 'MISSING', 'database', 'database_proxy',
+    'db', 'forms', 'menus', 'widgets', 'main_window', 'app', 'get_object_by_path', 'wic_dir',
+]
 
 
 def get_object_by_path(object_path, package_path=None):
@@ -0,0 +1,1051 @@
+"""
+Database helpers used by the framework.
+"""
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+import peewee
+from playhouse.pool import PooledSqliteDatabase
+from PyQt5 import QtCore
+
+import wic
+
+
+# table with a change counter per catalog table, kept up to date by triggers
+CHANGES_TABLE = 'wic_changes'
+
+_counted_tables = set()  # {(database, table_name)} with installed change counter triggers
+_uncounted_tables = set()  # {(database, table_name)} where the triggers could not be installed
+
+
+def _get_database(model):
+    database = model._meta.database
+    # unwrap the proxy, the real database is used as a key
+    return getattr(database, 'obj', database)
+
+
+def install_change_counter(model):
+    """Create (if missing) the triggers which count inserts, updates and deletes in the table of
+    the given model.
+
+    A failure is logged once and remembered, so it is not retried on each check.
+
+    Returns:
+        bool: whether the counter is available (the database might be read-only)
+    """
+    database = _get_database(model)
+    table_name = model._meta.table_name
+    if (database, table_name) in _counted_tables:
+        return True
+    if (database, table_name) in _uncounted_tables:
+        return False
+    quoted_name = table_name.replace("'", "''")
+    try:
+        with database.atomic():
+            database.execute_sql(
+                f'CREATE TABLE IF NOT EXISTS "{CHANGES_TABLE}" ('
+                f'"table_name" TEXT PRIMARY KEY, "counter" INTEGER NOT NULL DEFAULT 0)')
+            database.execute_sql(
+                f'INSERT OR IGNORE INTO "{CHANGES_TABLE}" ("table_name") VALUES (?)',
+                (table_name,))
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                database.execute_sql(
+                    f'CREATE TRIGGER IF NOT EXISTS "{table_name}__{operation.lower()}_counter" '
+                    f'AFTER {operation} ON "{table_name}" BEGIN '
+                    f'UPDATE "{CHANGES_TABLE}" SET "counter" = "counter" + 1 '
+                    f"WHERE \"table_name\" = '{quoted_name}'; END")
+    except peewee.DatabaseError:
+        logging.exception('Could not install change counter for table `%s`', table_name)
+        _uncounted_tables.add((database, table_name))
+        return False
+    _counted_tables.add((database, table_name))
+    return True
+
+
+def get_change_counter(model):
+    """Get the number of changes made to the table of the given model. It's a cheap query, so it
+    can be used to check periodically whether the table was modified.
+
+    Returns:
+        int: the counter or None, if it's not available
+    """
+    if not install_change_counter(model):
+        return None
+    cursor = _get_database(model).execute_sql(
+        f'SELECT "counter" FROM "{CHANGES_TABLE}" WHERE "table_name" = ?',
+        (model._meta.table_name,))
+    row = cursor.fetchone()
+    return row and row[0]
+
+
+def estimate_row_count(model):
+    """Cheaply estimate the number of rows in the table of the given model, using the statistics
+    gathered by the last ANALYZE or, if there are none, the maximum rowid.
+
+    Returns:
+        int: the estimate or None, if it's not available
+    """
+    database = _get_database(model)
+    table_name = model._meta.table_name
+    try:
+        row = database.execute_sql(
+            'SELECT "stat" FROM "sqlite_stat1" WHERE "tbl" = ? LIMIT 1', (table_name,)).fetchone()
+    except peewee.DatabaseError:
+        row = None  # no statistics table
+    if row:
+        return int(row[0].split()[0])
+    try:
+        row = database.execute_sql(f'SELECT max(rowid) FROM "{table_name}"').fetchone()
+    except peewee.DatabaseError:
+        return None  # WITHOUT ROWID table
+    return row[0] or 0
+
+
+def is_indexed(model, fields, where=None):
+    """Check whether there is an index which SQLite can use to order the rows of the model table
+    by the given fields (ignoring the directions).
+
+    SQLite indexes end with the rowid, so ordering by the fields followed by the integer primary
+    key needs an index on exactly these fields - the rowid must go right after them. A partial
+    index counts only if the query condition implies the index condition.
+
+    Args:
+        model: the model of the table
+        fields: the order fields
+        where: the query condition: a peewee expression or the SQL of the WHERE clause with the
+            parameters inlined (see `inline_params`)
+    """
+    columns = [field.column_name for field in fields]
+    exact = False  # whether the index must have no more columns
+    primary_key = model._meta.primary_key
+    if primary_key and isinstance(primary_key, peewee.AutoField):
+        if columns[-1:] == [primary_key.column_name]:
+            del columns[-1]
+            exact = True
+        if not columns:
+            return True
+    conditions = None  # of the query, parsed when there is a partial index
+    for index in _get_database(model).get_indexes(model._meta.table_name):
+        if index.columns[:len(columns)] != columns or exact and len(index.columns) != len(columns):
+            continue
+        index_where = re.split(r'\)\s+WHERE\s+', index.sql, maxsplit=1, flags=re.IGNORECASE)[1:]
+        if index_where:
+            if conditions is None:
+                conditions = split_conjuncts(get_where_sql(model, where))
+            if not all(condition in conditions for condition in split_conjuncts(index_where[0])):
+                continue  # the index lacks some of the rows
+        return True
+    return False
+
+
+def inline_params(sql, params):
+    """Put the query parameters into its SQL as literals, e.g. to compare conditions as text.
+    """
+    params = iter(params)
+
+    def make_literal(match):
+        if match.group() != '?':
+            return match.group()  # a string literal
+        value = next(params)
+        if value is None:
+            return 'NULL'
+        if isinstance(value, (bool, int, float)):
+            return str(int(value) if isinstance(value, bool) else value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+    return re.sub(r"'(?:[^']|'')*'|\?", make_literal, sql)
+
+
+def get_where_sql(model, where):
+    """Get the SQL of the WHERE clause of a query of the model with the given condition, with the
+    parameters inlined.
+
+    Args:
+        where: a peewee expression, the SQL of the clause or None
+    """
+    if where is None or isinstance(where, str):
+        return where or ''
+    sql, params = model.select(peewee.SQL('1')).where(where).sql()
+    return inline_params(sql, params).partition(' WHERE ')[2]
+
+
+def split_conjuncts(sql):
+    """Split an SQL condition into the conditions joined by AND, normalized for comparing as
+    text: without the table qualifiers, the quotes of the names and the enclosing parentheses.
+
+    Returns:
+        list: the normalized conditions
+    """
+    sql = re.sub(r'"\w+"\.', '', sql)
+    sql = re.sub(r'"(\w+)"', r'\1', sql)
+    sql = ' '.join(sql.split()).lower()
+    if not sql:
+        return []
+    # the positions of the top level ANDs and whether the whole condition is in parentheses
+    depth = 0
+    enclosed = sql.startswith('(')
+    splits = []
+    for match in re.finditer(r"'(?:[^']|'')*'|\(|\)| and ", sql):
+        token = match.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if depth == 0 and match.end() < len(sql):
+                enclosed = False
+        elif token == ' and ' and depth == 0:
+            splits.append(match)
+    if enclosed and not splits:
+        return split_conjuncts(sql[1:-1])
+    if not splits:
+        return [sql]
+    conjuncts = []
+    start = 0
+    for match in splits:
+        conjuncts += split_conjuncts(sql[start:match.start()])
+        start = match.end()
+    return conjuncts + split_conjuncts(sql[start:])
+
+
+def make_index(model, fields, where=None):
+    """Make an index definition for the given model fields.
+
+    Returns:
+        peewee.ModelIndex: the index, which can be passed to `create_index`
+    """
+    return peewee.ModelIndex(model, fields, where=where)
+
+
+def get_create_index_sql(model, index):
+    """Get the `CREATE INDEX` statement for the given index.
+    """
+    sql, params = model._schema._create_index(index).query()
+    assert not params, 'Index values are expected to be literals'
+    return sql
+
+
+def create_index(model, index):
+    """Create the given index of the model table, if it does not exist yet.
+    """
+    _get_database(model).execute_sql(get_create_index_sql(model, index))
+
+
+def sync_indexes(model):
+    """Create the indexes declared by the model, which are missing in the database: the indexes
+    of the fields (peewee indexes the foreign keys by default), `Meta.indexes` and the ones added
+    with `add_index`, including partial ones. The indexes are added to the existing table, it's
+    not rebuilt. An index is considered existing, if there is one with the same name or with the
+    same columns (and both are partial or both are not).
+
+    Returns:
+        list: the `CREATE INDEX` statements of the created indexes
+    """
+    database = _get_database(model)
+    table_name = model._meta.table_name
+    if not database.table_exists(table_name):
+        return []
+    existing = set()
+    for index in database.get_indexes(table_name):
+        existing.add(index.name)
+        existing.add((tuple(index.columns), ' WHERE ' in (index.sql or '').upper()))
+    created = []
+    for index in model._meta.fields_to_index():
+        columns = tuple(getattr(expression, 'column_name', None)
+                        for expression in index._expressions)
+        if index._name in existing or (columns, index._where is not None) in existing:
+            continue
+        sql = get_create_index_sql(model, index)
+        logging.info('Creating index: %s', sql)
+        create_index(model, index)
+        created.append(sql)
+    return created
+
+
+_search_indexed_tables = set()  # {(database, table_name)} with installed full-text search index
+
+
+def get_search_table(model):
+    return f'{model._meta.table_name}_search'
+
+
+def has_search_index(model):
+    """Check whether the full-text search index of the model table was installed in this session.
+    """
+    return (_get_database(model), model._meta.table_name) in _search_indexed_tables
+
+
+def install_search_index(model, fields):
+    """Create (if missing) a full-text search index over the given text fields of the model
+    table: an external content FTS5 table with trigram tokenizer (for substring matching), which
+    is kept in sync with the table by triggers. Building the index of a big table may take a while.
+
+    Returns:
+        bool: whether the index is available (SQLite might be built without FTS5)
+    """
+    database = _get_database(model)
+    table_name = model._meta.table_name
+    if (database, table_name) in _search_indexed_tables:
+        return True
+    search_table = get_search_table(model)
+    primary_key = model._meta.primary_key.column_name
+    columns = [field.column_name for field in fields]
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    new_values = ', '.join(f'new."{column}"' for column in columns)
+    old_values = ', '.join(f'old."{column}"' for column in columns)
+    delete_old = (f'INSERT INTO "{search_table}" ("{search_table}", rowid, {column_list}) '
+                  f"VALUES ('delete', old.\"{primary_key}\", {old_values});")
+    insert_new = (f'INSERT INTO "{search_table}" (rowid, {column_list}) '
+                  f'VALUES (new."{primary_key}", {new_values});')
+    try:
+        with database.atomic():
+            if not database.table_exists(search_table):
+                database.execute_sql(
+                    f'CREATE VIRTUAL TABLE "{search_table}" USING fts5({column_list}, '
+                    f'content="{table_name}", content_rowid="{primary_key}", '
+                    f'tokenize="trigram")')
+                database.execute_sql(
+                    f'INSERT INTO "{search_table}" ("{search_table}") VALUES (\'rebuild\')')
+            for operation, actions in (
+                    ('INSERT', insert_new), ('DELETE', delete_old),
+                    ('UPDATE', delete_old + ' ' + insert_new)):
+                database.execute_sql(
+                    f'CREATE TRIGGER IF NOT EXISTS "{table_name}__{operation.lower()}_search" '
+                    f'AFTER {operation} ON "{table_name}" BEGIN {actions} END')
+    except peewee.DatabaseError:
+        logging.exception('Could not install search index for table `%s`', table_name)
+        return False
+    _search_indexed_tables.add((database, table_name))
+    return True
+
+
+def search_condition(model, fields, text, use_index=True):
+    """Make WHERE condition selecting the rows whose given text fields contain all the words of
+    the text.
+
+    Words of 3 or more characters are looked up in the full-text search index (see
+    `install_search_index`). Shorter words can't be looked up by trigrams, so they are matched as
+    prefixes of the fields.
+
+    Args:
+        use_index (bool): whether to use the search index; without it (e.g. SQLite was built
+            without FTS5) the long words are matched as substrings of the fields with LIKE, which
+            scans the table
+
+    Returns:
+        the condition or None, if there are no words in the text
+    """
+    words = text.split()
+    long_words = [word for word in words if len(word) >= 3]
+    condition = None
+    if long_words and use_index:
+        search_table = get_search_table(model)
+        # each word in quotes - a substring to match
+        query = ' '.join('"%s"' % word.replace('"', '""') for word in long_words)
+        condition = model._meta.primary_key.in_(peewee.SQL(
+            f'(SELECT rowid FROM "{search_table}" WHERE "{search_table}" MATCH ?)', [query]))
+    for word in words:
+        if len(word) >= 3 and use_index:
+            continue
+        word_condition = None
+        for field in fields:
+            field_condition = field.contains(word) if len(word) >= 3 else field.startswith(word)
+            word_condition = field_condition if word_condition is None \
+                else word_condition | field_condition
+        condition = word_condition if condition is None else condition & word_condition
+    return condition
+
+
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """Call `listener(model, operation, record_ids)` after rows of a model table are inserted,
+    updated or deleted by this process (see `ChangeReportingQuery`). `operation` is 'insert',
+    'update' or 'delete'; `record_ids` is a list of the primary keys of the affected rows or None,
+    if it is not known which rows were affected (e.g. bulk updates).
+
+    The listener is called in the thread which executed the query.
+    """
+    _change_listeners.append(listener)
+
+
+def remove_change_listener(listener):
+    _change_listeners.remove(listener)
+
+
+def report_changes(model, operation, record_ids=None):
+    """Let the listeners know about a change of the model table.
+    """
+    for listener in list(_change_listeners):
+        try:
+            listener(model, operation, record_ids)
+        except Exception:
+            logging.exception('Change listener %s failed', listener)
+
+
+def _get_record_ids(model, where):
+    """Get the primary keys the given WHERE condition selects by, if it's `pk = ?` or
+    `pk IN (...)`.
+    """
+    primary_key = model._meta.primary_key
+    if isinstance(where, peewee.Expression) and where.lhs is primary_key:
+        if where.op == peewee.OP.EQ and not isinstance(where.rhs, peewee.Node):
+            return [where.rhs]
+        if where.op == peewee.OP.IN and isinstance(where.rhs, (list, tuple, set, frozenset)):
+            return list(where.rhs)
+    return None
+
+
+class ChangeReportingQuery():
+    """Mixin for model write queries, which reports the changed rows to the change listeners
+    after the query is executed.
+    """
+    _operation = None
+
+    def _execute(self, database):
+        result = super()._execute(database)
+        record_ids = self._get_changed_ids(result)
+        if record_ids != []:
+            report_changes(self.model, self._operation, record_ids)
+        return result
+
+    def _get_changed_ids(self, result):
+        return None
+
+
+class ModelInsert(ChangeReportingQuery, peewee.ModelInsert):
+    _operation = 'insert'
+
+    def _get_changed_ids(self, result):
+        # only a single row insert returns the primary key of the new row
+        if isinstance(self._insert, dict) and isinstance(result, int):
+            return [result]
+        return None
+
+
+class ModelUpdate(ChangeReportingQuery, peewee.ModelUpdate):
+    _operation = 'update'
+
+    def _get_changed_ids(self, result):
+        if result == 0:
+            return []  # nothing was changed
+        record_ids = _get_record_ids(self.model, self._where)
+        # an update by the primary keys might match fewer rows - then it's not known which
+        if record_ids is not None and result != len(set(record_ids)):
+            return None
+        return record_ids
+
+
+class ModelDelete(ChangeReportingQuery, peewee.ModelDelete):
+    _operation = 'delete'
+
+    def _get_changed_ids(self, result):
+        if result == 0:
+            return []  # nothing was deleted
+        record_ids = _get_record_ids(self.model, self._where)
+        if record_ids is not None and result != len(set(record_ids)):
+            return None
+        return record_ids
+
+
+# table with the changed rows of the logged tables, filled by triggers, so that every process
+# using the database can learn which rows the others changed
+CHANGE_LOG_TABLE = 'wic_change_log'
+CHANGE_LOG_MAX_AGE = 1  # days to keep the change log entries
+CHANGE_LOG_PRUNE_PERIOD = 1000  # the old entries are deleted each time this many are added
+CHANGE_LOG_MAX_READ = 10000  # more new entries are not read - all the tables are refreshed
+
+_logged_tables = {}  # {database: {table_name: model}} with installed change log triggers
+_change_log_readers = {}  # {database: ChangeLogReader}
+
+
+def install_change_log(model):
+    """Create (if missing) the triggers which log the inserted, updated and deleted rows of the
+    table of the given model. The entries older than `CHANGE_LOG_MAX_AGE` are deleted on the first
+    call for a database and then by a trigger of the log each `CHANGE_LOG_PRUNE_PERIOD` entries,
+    so the log doesn't grow while the processes using the database keep running.
+
+    Returns:
+        bool: whether the change log is available (the database might be read-only)
+    """
+    database = _get_database(model)
+    table_name = model._meta.table_name
+    logged_tables = _logged_tables.get(database)
+    if logged_tables is not None and table_name in logged_tables:
+        return True
+    primary_key = model._meta.primary_key
+    if not isinstance(primary_key, peewee.AutoField):
+        return False  # the entries refer to the rows by integer ids
+    quoted_name = table_name.replace("'", "''")
+    try:
+        with database.atomic():
+            database.execute_sql(
+                f'CREATE TABLE IF NOT EXISTS "{CHANGE_LOG_TABLE}" ('
+                f'"seq" INTEGER PRIMARY KEY AUTOINCREMENT, "table_name" TEXT NOT NULL, '
+                f'"record_id" INTEGER, "operation" TEXT NOT NULL, '
+                f'"time" REAL NOT NULL DEFAULT (julianday(\'now\')))')
+            database.execute_sql(
+                f'CREATE INDEX IF NOT EXISTS "{CHANGE_LOG_TABLE}_time" '
+                f'ON "{CHANGE_LOG_TABLE}" ("time")')
+            database.execute_sql(
+                f'CREATE TRIGGER IF NOT EXISTS "{CHANGE_LOG_TABLE}__prune" '
+                f'AFTER INSERT ON "{CHANGE_LOG_TABLE}" '
+                f'WHEN new."seq" % {int(CHANGE_LOG_PRUNE_PERIOD)} = 0 BEGIN '
+                f'DELETE FROM "{CHANGE_LOG_TABLE}" '
+                f'WHERE "time" < julianday(\'now\') - {float(CHANGE_LOG_MAX_AGE)}; END')
+            if logged_tables is None:
+                database.execute_sql(
+                    f'DELETE FROM "{CHANGE_LOG_TABLE}" WHERE "time" < julianday(\'now\') - ?',
+                    (CHANGE_LOG_MAX_AGE,))
+            for operation, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+                database.execute_sql(
+                    f'CREATE TRIGGER IF NOT EXISTS "{table_name}__{operation.lower()}_log" '
+                    f'AFTER {operation} ON "{table_name}" BEGIN '
+                    f'INSERT INTO "{CHANGE_LOG_TABLE}" ("table_name", "record_id", "operation") '
+                    f"VALUES ('{quoted_name}', {row}.\"{primary_key.column_name}\", "
+                    f"'{operation.lower()}'); END")
+    except peewee.DatabaseError:
+        logging.exception('Could not install change log for table `%s`', table_name)
+        return False
+    if logged_tables is None:
+        reader = _change_log_readers[database] = ChangeLogReader(database)
+        reader.read()  # start from now - what was changed before is fetched anyway
+    _logged_tables.setdefault(database, {})[table_name] = model
+    return True
+
+
+def has_change_log(model):
+    """Check whether the changes of the model table are logged (see `install_change_log`).
+    """
+    return model._meta.table_name in _logged_tables.get(_get_database(model), ())
+
+
+class ChangeLogReader():
+    """Reads the entries added to the change log of a database since the previous read.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._lock = threading.Lock()  # reads may be triggered by writes in worker threads
+        self._last_seq = None  # the last read entry
+        self._data_version = None
+
+    def is_changed(self):
+        """Cheaply check whether another connection committed changes to the database since the
+        previous check. Must be called from the same thread each time, as `PRAGMA data_version`
+        is specific to a connection.
+        """
+        data_version = self.database.execute_sql('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        return True
+
+    def read(self):
+        """Read the new entries of the change log.
+
+        Returns:
+            list: [(model, operation, record_ids)] in the order of the changes; consecutive
+                entries of the same table and operation are merged. If some entries were deleted
+                before they were read or there are more than `CHANGE_LOG_MAX_READ` of them (e.g.
+                another process updated a whole table), `record_ids` are None for all the logged
+                tables.
+        """
+        with self._lock:
+            database = self.database
+            # the last added entry, it's cheaper to check than counting the new entries
+            row = database.execute_sql(
+                'SELECT "seq" FROM "sqlite_sequence" WHERE "name" = ?',
+                (CHANGE_LOG_TABLE,)).fetchone()
+            last_seq = row[0] if row else 0
+            if self._last_seq is None:  # the first read
+                self._last_seq = last_seq
+                return []
+            if last_seq <= self._last_seq:
+                return []
+            logged_tables = _logged_tables.get(database, {})
+            if last_seq - self._last_seq > CHANGE_LOG_MAX_READ:
+                missed = True
+                entries = ()
+            else:
+                entries = database.execute_sql(
+                    f'SELECT "seq", "table_name", "record_id", "operation" '
+                    f'FROM "{CHANGE_LOG_TABLE}" WHERE "seq" > ? AND "seq" <= ? ORDER BY "seq"',
+                    (self._last_seq, last_seq)).fetchall()
+                missed = not entries or entries[0][0] != self._last_seq + 1
+            self._last_seq = last_seq
+        if missed:  # deleted as too old or too many to read
+            return [(model, 'update', None) for model in logged_tables.values()]
+        changes = []
+        for _, table_name, record_id, operation in entries:
+            model = logged_tables.get(table_name)
+            if model is None:
+                continue  # logged by another process, not shown by this one
+            if changes and changes[-1][0] is model and changes[-1][1] == operation:
+                changes[-1][2].append(record_id)
+            else:
+                changes.append((model, operation, [record_id]))
+        return changes
+
+
+def get_change_log_readers():
+    """Get the change log readers of the databases with logged tables.
+    """
+    return list(_change_log_readers.values())
+
+
+# defaults of the database connection settings, see `connect`
+DATABASE_SETTINGS = dict(
+    journal_mode='wal',  # readers don't block the writer and vice versa
+    synchronous='normal',  # safe with WAL, commits don't wait for fsync
+    cache_size=-64000,  # KiB (negative) or pages per connection
+    mmap_size=256 * 1024 * 1024,  # bytes of the database file mapped into memory
+    busy_timeout=5000,  # ms to wait for a lock before failing with "database is locked"
+    max_connections=0,  # 0 - the threads of the global thread pool, the GUI thread and a spare
+    pool_timeout=10,  # seconds to wait for a connection, when all of them are in use
+    stale_timeout=600,  # seconds after which an idle connection is reopened
+    trace_queries=True,  # record the executed queries, see `QueryTracer`
+    slow_query_ms=100,  # the plans of the queries taking longer are analysed
+)
+
+
+class SqliteDatabase(PooledSqliteDatabase):
+    """SQLite database with a connection per thread, taken from a pool, so the GUI thread and
+    the worker threads can query the database at the same time. The connections
+    are configured with the pragmas given to `connect`.
+    """
+    def execute(self, query, **context_options):
+        if not query_tracer.enabled:
+            return super().execute(query, **context_options)
+        _traced_model.value = getattr(query, 'model', None)
+        try:
+            return super().execute(query, **context_options)
+        finally:
+            _traced_model.value = None
+
+    def execute_sql(self, sql, params=None):
+        if not query_tracer.enabled:
+            return super().execute_sql(sql, params)
+        return query_tracer.trace(self, super().execute_sql, sql, params)
+
+    def release_connection(self):
+        """Return the connection of the current thread to the pool, unless a transaction is
+        open. Worker threads call this when a task is done, so the connection can be reused by
+        another thread.
+        """
+        if not self.is_closed() and not self.in_transaction():
+            self.close()
+
+
+def connect(path, **settings):
+    """Create the database object for the given SQLite file.
+
+    Args:
+        path (str): path to the database file
+        settings: overrides of `DATABASE_SETTINGS`: the pragmas, `max_connections`,
+            `stale_timeout` and `pool_timeout` of the pool and whether to trace the queries
+
+    Returns:
+        SqliteDatabase: the database, which connects lazily in each thread
+    """
+    settings = dict(DATABASE_SETTINGS, **settings)
+    # each worker thread of the DB tasks (see `wic.scheduler`) may hold a connection
+    max_connections = settings.pop('max_connections') \
+        or QtCore.QThreadPool.globalInstance().maxThreadCount() + 2
+    stale_timeout = settings.pop('stale_timeout')
+    pool_timeout = settings.pop('pool_timeout')
+    query_tracer.enabled = settings.pop('trace_queries')
+    query_tracer.slow_query_time = settings.pop('slow_query_ms') / 1000
+    return SqliteDatabase(
+        path, pragmas=settings, max_connections=max_connections, stale_timeout=stale_timeout,
+        timeout=pool_timeout, check_same_thread=False)  # the pooled connections are reused by other threads
+
+
+def release_connection():
+    """Return the connection of the current thread to the pool of the framework database, if
+    it's pooled (see `SqliteDatabase`).
+    """
+    database = wic.database
+    if isinstance(database, SqliteDatabase):
+        database.release_connection()
+
+
+# what the executed queries are done for, e.g. the title of a form; see `trace_origin`
+query_origin = contextvars.ContextVar('query_origin', default=None)
+_traced_model = threading.local()  # the model of the query being executed in this thread
+
+
+@contextlib.contextmanager
+def trace_origin(origin):
+    """Context manager which attributes the queries executed inside it to the given origin.
+    """
+    token = query_origin.set(origin)
+    try:
+        yield
+    finally:
+        query_origin.reset(token)
+
+
+class QueryRecord():
+    """An executed query. The duration includes fetching the rows.
+    """
+    __slots__ = ['time', 'thread', 'origin', 'model', 'sql', 'params', 'duration', 'rows',
+                 'error']
+
+    def to_dict(self):
+        return dict(
+            time=self.time, thread=self.thread, origin=self.origin,
+            model=self.model and self.model.__name__, sql=self.sql, params=self.params,
+            duration_ms=round(self.duration * 1000, 3), rows=self.rows, error=self.error)
+
+
+class _TracedCursor():
+    """DB-API cursor wrapper which adds the time spent fetching the rows and their number to the
+    record of the query. The rows are fetched in batches, so the overhead per row is a list pop.
+    """
+    __slots__ = ['_cursor', '_record', '_rows', '_database']
+    _batch_size = 256
+
+    def __init__(self, cursor, record, database):
+        self._cursor = cursor
+        self._record = record
+        self._rows = []  # fetched rows in reverse order
+        self._database = database  # None, when all the rows are fetched
+
+    def _fetch(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall() if size is None else self._cursor.fetchmany(size)
+        record = self._record
+        record.duration += time.perf_counter() - start
+        record.rows += len(rows)
+        if self._database is not None and (size is None or len(rows) < size):
+            query_tracer.check_slow_query(self._database, record)
+            self._database = None
+        return rows
+
+    def fetchone(self):
+        rows = self._rows
+        if not rows:
+            rows = self._fetch(self._batch_size)
+            if not rows:
+                return None
+            rows.reverse()
+            self._rows = rows
+        return rows.pop()
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self._cursor.arraysize
+        rows = self._rows[:-size - 1:-1]
+        del self._rows[-size:]
+        if len(rows) < size:
+            rows += self._fetch(size - len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[::-1]
+        self._rows = []
+        return rows + self._fetch()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class QueryTracer():
+    """Records the queries executed by `SqliteDatabase` into a ring buffer of the given size: the
+    SQL, the parameters, the duration, the number of fetched rows, the model and the origin (see
+    `trace_origin`). The overhead is a record object per query and a couple of clock reads per
+    fetch, so the tracer can be left on.
+    """
+    def __init__(self, max_records=10000):
+        self.enabled = True
+        self._records = collections.deque(maxlen=max_records)
+        self.slow_query_time = 0.1  # seconds
+        self._slow_queries = {}  # {sql: SlowQuery}
+
+    def trace(self, database, execute_sql, sql, params):
+        """Execute a query of the database with the given function and record it.
+
+        Returns:
+            the cursor, which records the fetched rows
+        """
+        record = QueryRecord()
+        record.time = time.time()
+        record.thread = threading.current_thread().name
+        record.origin = query_origin.get()
+        record.model = getattr(_traced_model, 'value', None)
+        record.sql = sql
+        record.params = params
+        record.rows = 0
+        record.error = None
+        start = time.perf_counter()
+        try:
+            cursor = execute_sql(sql, params)
+        except Exception as exc:
+            record.error = str(exc)
+            raise
+        finally:
+            record.duration = time.perf_counter() - start
+            self._records.append(record)
+        if cursor.description is None:  # no rows to fetch
+            self.check_slow_query(database, record)
+            database = None
+        return _TracedCursor(cursor, record, database)
+
+    def check_slow_query(self, database, record):
+        """If the recorded query took too long, explain it, once per distinct SQL.
+        """
+        if record.duration < self.slow_query_time or record.error is not None:
+            return
+        slow_query = self._slow_queries.get(record.sql)
+        if slow_query is None:
+            if not record.sql.lstrip()[:6].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                return
+            try:
+                plan = database.connection().execute(
+                    f'EXPLAIN QUERY PLAN {record.sql}', record.params or ()).fetchall()
+            except Exception:
+                logging.exception('Could not explain query %s', record.sql)
+                return
+            logging.warning('Slow query (%.0f ms): %s', record.duration * 1000, record.sql)
+            slow_query = self._slow_queries.setdefault(
+                record.sql, SlowQuery(record.sql, record.params, [row[-1] for row in plan]))
+        slow_query.count += 1
+        slow_query.max_duration = max(slow_query.max_duration, record.duration)
+
+    def slow_queries(self):
+        """Get the explained slow queries, see `check_slow_query`.
+        """
+        return list(self._slow_queries.values())
+
+    def records(self):
+        """Get the recorded queries, the oldest first.
+        """
+        return list(self._records.copy())
+
+    def clear(self):
+        self._records.clear()
+        self._slow_queries.clear()
+
+    def get_stats(self):
+        """Get the statistics of the recorded queries grouped by their SQL.
+
+        Returns:
+            list: [dict(sql, count, total, max, rows, errors, origins, models)], durations are in
+                seconds
+        """
+        stats = {}
+        for record in self.records():
+            stat = stats.get(record.sql)
+            if stat is None:
+                stat = stats[record.sql] = dict(
+                    sql=record.sql, count=0, total=0, max=0, rows=0, errors=0, origins=set(),
+                    models=set())
+            stat['count'] += 1
+            stat['total'] += record.duration
+            stat['max'] = max(stat['max'], record.duration)
+            stat['rows'] += record.rows
+            stat['errors'] += record.error is not None
+            if record.origin is not None:
+                stat['origins'].add(record.origin)
+            if record.model is not None:
+                stat['models'].add(record.model.__name__)
+        return list(stats.values())
+
+    def export(self, file_path):
+        """Write the recorded queries into a JSON lines file, a query per line.
+        """
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for record in self.records():
+                file.write(json.dumps(record.to_dict(), default=str) + '\n')
+
+
+query_tracer = QueryTracer()
+
+
+class SlowQuery():
+    """A query which took longer than the threshold and its plan.
+    """
+    def __init__(self, sql, params, plan):
+        self.sql = sql
+        self.params = params
+        self.plan = plan  # details of the `EXPLAIN QUERY PLAN` steps
+        self.count = 0
+        self.max_duration = 0
+
+    def get_where(self):
+        """Get the SQL of the WHERE clause with the parameters inlined (see `inline_params`).
+        """
+        sql = inline_params(self.sql, self.params or ())
+        return re.split(r' (?:GROUP BY|ORDER BY|LIMIT) ', sql.partition(' WHERE ')[2])[0]
+
+    def get_table_scans(self):
+        """Find the tables which are scanned without an index and the columns of the conditions
+        and the order, by which they could be searched instead.
+
+        Returns:
+            list: [(table_name, [column_name])]; the columns are compared with `=`, `IN` or `IS`
+                first, then the range or the order columns; might be empty
+        """
+        sql = self.sql
+        # peewee refers to the tables by aliases
+        tables = {}
+        for table_name, alias in re.findall(r'(?:FROM|JOIN) "(\w+)"(?: AS "(\w+)")?', sql):
+            tables[alias or table_name] = table_name
+        where = re.split(r' (?:GROUP BY|ORDER BY|LIMIT) ', sql.partition(' WHERE ')[2])[0]
+        order_by = re.split(r' (?:LIMIT|OFFSET) ', sql.partition(' ORDER BY ')[2])[0]
+        sorted_by_temp_tree = any('TEMP B-TREE FOR ORDER BY' in step for step in self.plan)
+        scans = []
+        for step in self.plan:
+            match = re.match(r'SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)', step)
+            if match is None or 'USING' in match.group(3):
+                continue  # not a full scan
+            alias = match.group(2) or match.group(1)
+            if alias not in tables:
+                continue  # a subquery, a virtual table or another database object
+            column_pattern = rf'"{alias}"\."(\w+)"'
+            columns = []
+            for column, operator in re.findall(
+                    column_pattern + r' (=|IN|IS|<|>|<=|>=|BETWEEN) ', where):
+                if operator in ('=', 'IN', 'IS') and column not in columns:
+                    columns.append(column)
+            ranges = [column for column, operator in re.findall(
+                column_pattern + r' (<|>|<=|>=|BETWEEN) ', where) if column not in columns]
+            if sorted_by_temp_tree or not ranges:
+                columns += [column for column in re.findall(column_pattern, order_by)
+                            if column not in columns]
+            else:
+                columns.append(ranges[0])
+            scans.append((tables[alias], columns))
+        return scans
+
+
+class IndexSuggestion():
+    """An index which would let SQLite avoid scanning a table in some of the slow queries.
+    """
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.index = make_index(model, fields)
+        self.sql = get_create_index_sql(model, self.index)
+        self.slow_queries = []
+
+    def apply(self):
+        """Create the index.
+        """
+        create_index(self.model, self.index)
+
+
+def get_index_suggestions(models):
+    """Suggest indexes for the tables of the given models, which were scanned by the slow queries
+    (see `QueryTracer.check_slow_query`).
+
+    Returns:
+        list: [IndexSuggestion], which are not created yet
+    """
+    models_by_table = {model._meta.table_name: model for model in models}
+    suggestions = {}
+    for slow_query in query_tracer.slow_queries():
+        for table_name, columns in slow_query.get_table_scans():
+            model = models_by_table.get(table_name)
+            if model is None or not columns:
+                continue
+            fields_by_column = {field.column_name: field for field in model._meta.sorted_fields}
+            fields = [fields_by_column[column] for column in columns
+                      if column in fields_by_column]
+            if not fields or is_indexed(model, fields, slow_query.get_where()):
+                continue
+            key = (model, tuple(field.name for field in fields))
+            if key not in suggestions:
+                suggestions[key] = IndexSuggestion(model, fields)
+            suggestions[key].slow_queries.append(slow_query)
+    return list(suggestions.values())
+
+
+class QueryCancelled(Exception):
+    """Raised when the queries of an operation are aborted, because it was cancelled or exceeded
+    its time budget (see `CancellationToken`).
+    """
+
+
+_running_tokens = set()  # tokens of the operations being run
+_thread_tokens = threading.local()  # the stack of the tokens entered in the current thread
+
+
+class CancellationToken():
+    """Lets to abort the queries of an operation from another thread (e.g. by a cancel button) or
+    when its time budget is exceeded. While the token is entered (it's a context manager), it is
+    checked by the SQLite progress handler of the connection of the current thread, so even a
+    long running statement is aborted.
+    """
+    _progress_period = 10000  # SQLite virtual machine instructions between the checks
+
+    def __init__(self, database, description='', time_budget=None):
+        """
+        Args:
+            database (peewee.SqliteDatabase): the database the queries of the operation are sent to
+            description (str): what the operation does, e.g. to show in the status bar
+            time_budget (Optional[float]): seconds the operation may run
+        """
+        self.database = getattr(database, 'obj', database)  # unwrap the proxy
+        self.description = description
+        self.time_budget = time_budget
+        self.deadline = None
+        self.cancelled = False
+
+    def cancel(self):
+        """Request aborting the operation. Can be called from any thread.
+        """
+        self.cancelled = True
+
+    def is_expired(self):
+        """Check whether the operation must be aborted.
+        """
+        return self.cancelled or self.deadline is not None and time.monotonic() > self.deadline
+
+    def _set_progress_handler(self, connection):
+        connection.set_progress_handler(self.is_expired, self._progress_period)
+
+    def __enter__(self):
+        if self.time_budget is not None:
+            self.deadline = time.monotonic() + self.time_budget
+        if self.is_expired():  # e.g. cancelled while waiting for a worker thread
+            raise QueryCancelled(self.description)
+        self._set_progress_handler(self.database.connection())
+        tokens = getattr(_thread_tokens, 'stack', None)
+        if tokens is None:
+            tokens = _thread_tokens.stack = []
+        tokens.append(self)
+        _running_tokens.add(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _running_tokens.discard(self)
+        tokens = _thread_tokens.stack
+        tokens.remove(self)
+        if not self.database.is_closed():
+            connection = self.database.connection()
+            if tokens and tokens[-1].database is self.database:
+                tokens[-1]._set_progress_handler(connection)  # the outer operation
+            else:
+                connection.set_progress_handler(None, 0)
+        if isinstance(exc_value, (peewee.OperationalError, sqlite3.OperationalError)) \
+                and self.is_expired():  # SQLite reports "interrupted"
+            reason = 'cancelled' if self.cancelled else 'time budget exceeded'
+            raise QueryCancelled(f'{self.description}: {reason}') from exc_value
+        return False
+
+
+def get_running_tokens():
+    """Get the cancellation tokens of the operations being run in all the threads.
+    """
+    return list(_running_tokens)
@@ -4,6 +4,7 @@ from PyQt5 import QtGui, QtCore, uic, QtWidgets
 
 import wic
 import wic.widgets
+from wic import db
 
 
 class FormNotFoundError(Exception):
@@ -153,7 +154,8 @@ class Form(QtWidgets.QDialog):
         self._ = FormWidgetsProxy(self)
 
         try:
-            self.on_open()
+            with db.trace_origin(self.windowTitle()):
+                self.on_open()
         except Exception:
             traceback.print_exc()
 
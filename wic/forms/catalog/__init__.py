@@ -1,4 +1,4 @@
-import sys
+import sys, time
 
 from PyQt5 import QtGui, QtCore, QtWidgets
 import peewee
@@ -184,10 +184,13 @@ class CatalogForm(forms.Form):
     _is_toolbar_visible = True
 
     _catalog_model = None
-    # which columns to show in form 'field_name1+100,100 field2,+field3 250,field4 -,field5'
+    # which columns to show in the form and fetch, e.g. 'last_name 150, first_name, +notes 300'
+    # (see `parse_columns`); all the fields if None
     _columns = None
     # you can override this to customize visual appearance
     _view_model = CatalogViewModel
+    _filter_delay = 300  # milliseconds after the last key press to apply the quick filter
+    _type_ahead_timeout = 1  # seconds after the last typed character to start a new text
 
     itemSelected = QtCore.pyqtSignal(CatalogModel)
     # 0: selection causes opening item form,
@@ -244,11 +247,26 @@ class CatalogForm(forms.Form):
         toolbar.setIconSize(QtCore.QSize(16, 16))
         self.menu = menu
 
+        # quick filter - the view is narrowed as you type
+        toolbar.addSeparator()
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText('Filter')
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.setMaximumWidth(250)
+        toolbar.addWidget(self.filter_edit)
+        # apply the filter only when typing pauses
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(self._filter_delay)
+        self._filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(lambda text: self._filter_timer.start())
+        self.filter_edit.returnPressed.connect(self.apply_filter)
+
     def setup_table_view(self, table_view):
         assert isinstance(table_view, QtWidgets.QTableView)
 
         # create catalog view model
-        catalog_view_model = self._view_model(self._catalog_model)
+        catalog_view_model = self._view_model(self._catalog_model, columns=self._columns)
 
         table_view.setSelectionBehavior(table_view.SelectItems)
         table_view.setSelectionMode(table_view.SingleSelection)
@@ -268,6 +286,13 @@ class CatalogForm(forms.Form):
         table_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
 
         table_view.setModel(catalog_view_model)
+        for column_no, column in enumerate(catalog_view_model.columns):
+            if column.width is not None:
+                table_view.setColumnWidth(column_no, column.width)
+        # clicking a header section orders the rows by its column on the DB side (Shift+click -
+        # by several columns); initially the rows are ordered by the primary key
+        table_view.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        table_view.setSortingEnabled(True)
 
         # signals
         table_view.customContextMenuRequested.connect(self.onTableViewContextMenuRequested)
@@ -276,12 +301,24 @@ class CatalogForm(forms.Form):
         catalog_view_model.modelReset.connect(self.onModelReset)
         table_view.verticalScrollBar().valueChanged.connect(self.ensure_selection_visible)
         table_view.horizontalScrollBar().valueChanged.connect(self.ensure_selection_visible)
+        # let the model know which rows are shown, so it prefetches the rows ahead
+        table_view.verticalScrollBar().valueChanged.connect(self.on_visible_rows_changed)
+        table_view.verticalScrollBar().rangeChanged.connect(self.on_visible_rows_changed)
+        # typing in the table goes to the first row starting with the typed text
+        self._type_ahead_text = ''
+        self._type_ahead_time = 0
+        catalog_view_model.rowFound.connect(self.on_row_found)
 
         table_view.setCurrentIndex(table_view.model().index(0, 0))
 
     def eventFilter(self, table_view, event):  # target - tableView
         #print('eventFilter', event)
         if event.type() == QtCore.QEvent.KeyPress:
+            text = event.text()
+            if text.isprintable() and text and event.modifiers() in (
+                    QtCore.Qt.NoModifier, QtCore.Qt.ShiftModifier):
+                self.type_ahead(text)
+                return True
             if event.modifiers() in (QtCore.Qt.NoModifier, QtCore.Qt.KeypadModifier):
                 key = event.key()
                 if key in (QtCore.Qt.Key_Enter, QtCore.Qt.Key_Return):
@@ -312,6 +349,55 @@ class CatalogForm(forms.Form):
 
         return super().eventFilter(table_view, event) # standard event processing
 
+    def type_ahead(self, text):
+        """Add the typed text to the text typed within `_type_ahead_timeout` and go to the first
+        row whose value of the sorted column starts with it. If the rows are not ordered by a
+        text column, they are ordered by the current one, if it's a text column.
+        """
+        now = time.monotonic()
+        if now - self._type_ahead_time > self._type_ahead_timeout:
+            self._type_ahead_text = ''
+        self._type_ahead_time = now
+        text = self._type_ahead_text + text
+        if not text.strip():
+            return  # a space can't start the text
+        self._type_ahead_text = text
+        table_view = self.table_view
+        view_model = table_view.model()
+        if not view_model.find_row(text):
+            column = table_view.currentIndex().column()
+            if column < 0 or not isinstance(view_model.columns[column].field, peewee.CharField):
+                return
+            # not `sortByColumn`: the model adds the column to the order while Shift is held,
+            # e.g. for typing a capital letter
+            view_model.set_sort_columns([(column, QtCore.Qt.AscendingOrder)])
+            header = table_view.horizontalHeader()
+            header.blockSignals(True)  # the header would sort the model again
+            header.setSortIndicator(column, QtCore.Qt.AscendingOrder)
+            header.blockSignals(False)
+            view_model.find_row(text)
+
+    def on_row_found(self, text, row_no):
+        """Go to the row found by `type_ahead`.
+        """
+        if text != self._type_ahead_text:
+            return  # more characters were typed in the meantime
+        if row_no is None:
+            QtWidgets.QApplication.beep()
+            return
+        table_view = self.table_view
+        view_model = table_view.model()
+        index = view_model.index(
+            min(row_no, view_model.rowCount(None) - 1), max(table_view.currentIndex().column(), 0))
+        table_view.scrollTo(index, table_view.PositionAtTop)
+        table_view.setCurrentIndex(index)
+
+    def apply_filter(self):
+        """Filter the catalog items by the text of the quick filter.
+        """
+        self._filter_timer.stop()
+        self.table_view.model().set_filter(self.filter_edit.text())
+
     def ensure_selection_visible(self, *args):
         """Ensure that selection moves when scrolling - it must be always visible.
         """
@@ -344,6 +430,18 @@ class CatalogForm(forms.Form):
         if column != _column or row != _row:
             table_view.setCurrentIndex(table_view.model().index(row, column))
 
+    def on_visible_rows_changed(self, *args):
+        """Pass the range of the rows shown in the table view to its model.
+        """
+        table_view = self.table_view
+        first_row = table_view.rowAt(0)
+        if first_row < 0:
+            return  # no rows
+        last_row = table_view.rowAt(table_view.viewport().height() - 1)
+        if last_row < 0:  # the rows don't fill the viewport
+            last_row = table_view.model().rowCount(None) - 1
+        table_view.model().set_visible_rows(first_row, last_row)
+
     def onModelAboutToBeReset(self):
         """Remember the selected row when the model is about to be reset.
         """
@@ -373,9 +471,22 @@ class CatalogForm(forms.Form):
         catalog_item = self._catalog_model()
         open_catalog_item_form(catalog_item)
 
-    def edit_item(self):
+    def current_item(self):
+        """Get the item of the current row.
+
+        Returns:
+            CatalogModel: the item or None, if there is no current row or its item is not loaded
+                (e.g. the row was deleted in the meantime)
+        """
         current_index = self.table_view.selectionModel().currentIndex()
-        catalog_item = self.table_view.model().item(current_index.row())
+        if not current_index.isValid():
+            return None
+        return self.table_view.model().item(current_index.row())
+
+    def edit_item(self):
+        catalog_item = self.current_item()
+        if catalog_item is None:
+            return
         if self._type == 0:
             open_catalog_item_form(catalog_item)
         elif self._type == 1:
@@ -387,13 +498,14 @@ class CatalogForm(forms.Form):
             self.itemSelected.emit(catalog_item)
 
     def delete_item(self):
+        catalog_item = self.current_item()
+        if catalog_item is None:
+            return
         if QtWidgets.QMessageBox.question(
                 self, 'Delete', 'Are you sure?',
                 QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.Cancel
         ) == QtWidgets.QMessageBox.Yes:
-            current_index = self.table_view.selectionModel().currentIndex()
-            catalog_item = self.table_view.model().item(current_index.row())
-            catalog_item.delete()
+            catalog_item.delete_instance()
 
 
 def open_catalog_item_form(catalog_item, FormClass=None, **kwargs):
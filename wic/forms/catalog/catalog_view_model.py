@@ -1,10 +1,18 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 from wic.datetime import format as format_date
-import time, inspect
+import functools, inspect, math, time
 
 import peewee
 import wic
 
+from wic.db import (
+    is_indexed, make_index, get_create_index_sql, create_index, has_search_index,
+    install_search_index, search_condition, ModelInsert, ModelUpdate, ModelDelete)
+from .display_cache import record_display_cache
+from .row_source import get_catalog_rows, make_sort_key
+from .resident_table import get_resident_table
+from wic.scheduler import DbTask, scheduler, VISIBLE, PREFETCH, MAINTENANCE
+
 
 class Role():
     """
@@ -83,7 +91,10 @@ class Styles:
     class DateStyle(Style):
         """Style for items with Date values.
         """
-        display = Role(QtCore.Qt.DisplayRole, format_date)
+        @Role(QtCore.Qt.DisplayRole)
+        def display(self, value):
+            return format_date(value)
+
         text_alignment = Role(
             QtCore.Qt.TextAlignmentRole, QtCore.Qt.AlignVCenter | QtCore.Qt.AlignHCenter)
 
@@ -128,16 +139,20 @@ class Styles:
         assert isinstance(field, peewee.Field)
 
         if isinstance(field, peewee.DecimalField):
-            return cls.DecimalStyle(format=f',.%{field.decimal_places}f', field_name=field.name)
+            return cls.DecimalStyle(format=f',.{field.decimal_places}f', field_name=field.name)
         elif isinstance(field, peewee.DateField):
             return cls.DateStyle(field_name=field.name)
         elif isinstance(field, peewee.BooleanField):
             return cls.BoolStyle(field_name=field.name)
         elif isinstance(field, peewee.ForeignKeyField):
-            return cls.RecordStyle(field_name=field.name)
+            return cls.RecordStyle(field_name=field.name, rel_model=field.rel_model)
         return cls.Style(field_name=field.name)
 
 
+# `Model.delete` can't be called on an instance (use `delete_instance`) in newer peewee
+_classmethod_only = getattr(peewee, 'classmethod_only', classmethod)
+
+
 class CatalogModel(peewee.Model):
     """Base model for all catalogs.
     """
@@ -146,6 +161,42 @@ class CatalogModel(peewee.Model):
     class Meta:
         database = wic.database_proxy  # Use proxy for our DB.
 
+    @classmethod
+    def active_index(cls, *fields, **kwargs):
+        """Make a partial index of the items which are not marked as deleted, for `add_index`. The
+        queries must have condition `deleted == False` to use it.
+
+        Args:
+            fields: the indexed fields
+            kwargs: see `peewee.ModelIndex`
+        """
+        kwargs.setdefault('name', '_'.join(
+            [cls._meta.name] + [field.column_name for field in fields] + ['active']))
+        return cls.index(*fields, **kwargs).where(cls.deleted == False)
+
+    # the write queries report the changed rows, so the open catalog views are updated at once
+
+    @classmethod
+    def insert(cls, __data=None, **insert):
+        return ModelInsert(cls, cls._normalize_data(__data, insert))
+
+    @classmethod
+    def insert_many(cls, rows, fields=None):
+        return ModelInsert(cls, insert=rows, columns=fields)
+
+    @classmethod
+    def insert_from(cls, query, fields):
+        columns = [getattr(cls, field) if isinstance(field, str) else field for field in fields]
+        return ModelInsert(cls, insert=query, columns=columns)
+
+    @classmethod
+    def update(cls, __data=None, **update):
+        return ModelUpdate(cls, cls._normalize_data(__data, update))
+
+    @_classmethod_only
+    def delete(cls):
+        return ModelDelete(cls)
+
     # @classmethod
     # def _handleTableMissing(cls, db):
     #     """Default implementation of situation when upon checking there was not found the table
@@ -164,99 +215,599 @@ class CatalogModel(peewee.Model):
     #     else:
     #         super()._handleTableMissing(db)
 
+def get_catalog_models(model=CatalogModel):
+    """Get all the defined (imported) catalog models.
+    """
+    models = []
+    for subclass in model.__subclasses__():
+        models.append(subclass)
+        models.extend(get_catalog_models(subclass))
+    return models
+
+
+_NO_ACCESSOR = (None, None)  # the role has no data
+
+# roles whose data is formatted once per cell and kept with the cached page
+_FORMATTED_ROLES = (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole)
+
+
+def make_cell_accessors(style, column, deferred=False):
+    """Compile the roles of a column style into accessors of the cell data, so that the data
+    of a cell is got with one dict lookup and at most one function call.
+
+    Args:
+        style: the column style
+        column: index of the field value in the page rows
+        deferred (bool): the values are fetched lazily, per row (see `Column`)
+
+    Returns:
+        dict: {role: (function, None)}, where the function gets the data from a page by the row
+            offset (MISSING if the display string of the referenced item or the deferred value
+            is not fetched yet), or {role: (None, value)} for roles whose data does not depend
+            on the item
+    """
+    rel_model = getattr(style, 'rel_model', None)
+    accessors = {}
+    for role, data in style.data.items():
+        if not callable(data):
+            if data is not None:
+                accessors[role] = (None, data)
+            continue
+        format_value = functools.partial(data, style)
+        if deferred:
+            def get_value(page, row_offset, format_value=format_value):
+                value = page.deferred_values.get((row_offset, column), wic.MISSING)
+                return value if value is wic.MISSING else format_value(value)
+        elif rel_model is not None:
+            # use the display string, not to query the referenced item for each cell
+            def get_value(page, row_offset, format_value=format_value,
+                          get_string=record_display_cache.get):
+                value = get_string(rel_model, page[row_offset][column], wic.MISSING)
+                return value if value is wic.MISSING else format_value(value)
+        elif role in _FORMATTED_ROLES:
+            # Qt asks for these on every repaint - don't format the same value again
+            def get_value(page, row_offset, format_value=format_value, role=role):
+                key = (row_offset, column, role)
+                try:
+                    return page.display_strings[key]
+                except KeyError:
+                    value = page.display_strings[key] = format_value(page[row_offset][column])
+                    return value
+        else:
+            def get_value(page, row_offset, format_value=format_value):
+                return format_value(page[row_offset][column])
+        accessors[role] = (get_value, None)
+    return accessors
+
+
+class Column():
+    """A column of a catalog view: the field whose values it shows, its width in pixels (None -
+    the default one) and whether it's a large column, whose values are not fetched with the
+    pages, but lazily, per row, when a cell (or its tool tip) is shown.
+    """
+    __slots__ = ['field', 'width', 'deferred']
+
+    def __init__(self, field, width=None, deferred=False):
+        self.field = field
+        self.width = width
+        self.deferred = deferred
+
+
+def is_large_field(field):
+    """Whether the values of the field may take kilobytes, so they are fetched lazily.
+    """
+    return isinstance(field, (peewee.TextField, peewee.BlobField))
+
+
+def parse_columns(catalog_model, spec=None):
+    """Parse the description of the columns of a catalog view: comma separated
+    `[+]field_name [width]`, e.g. `'last_name 150, first_name, +notes 300'`. `+` marks a large
+    column (see `Column`); the `TextField` and `BlobField` columns are always large.
+
+    Args:
+        catalog_model: CatalogModel subclass
+        spec (Optional[str]): the description; all the fields of the model if None
+
+    Returns:
+        list: [Column]
+    """
+    if spec is None:
+        return [Column(field, deferred=is_large_field(field))
+                for field in catalog_model._meta.sorted_fields]
+    columns = []
+    for column_spec in spec.split(','):
+        words = column_spec.split()
+        if not words:
+            continue
+        assert len(words) <= 2, f'Bad column description `{column_spec.strip()}`'
+        field_name = words[0].lstrip('+')
+        field = catalog_model._meta.fields.get(field_name)
+        assert field is not None, f'`{catalog_model.__name__}` has no field `{field_name}`'
+        width = int(words[1]) if len(words) > 1 else None
+        # the display strings of the referenced items are resolved for whole pages
+        deferred = (words[0].startswith('+') or is_large_field(field)) \
+            and not isinstance(field, peewee.ForeignKeyField)
+        columns.append(Column(field, width, deferred))
+    return columns
+
+
+def get_search_fields(catalog_model):
+    """Get the fields by which the quick filter searches: `search_fields` (names) option of the
+    model Meta or all its CharFields.
+    """
+    meta = catalog_model._meta
+    field_names = getattr(meta, 'search_fields', None)
+    if field_names is not None:
+        return [meta.fields[field_name] for field_name in field_names]
+    return [field for field in meta.sorted_fields if isinstance(field, peewee.CharField)]
+
 
 class CatalogViewModel(QtCore.QAbstractTableModel):
     """Qt table model for showing list of catalog items.
+
+    The rows are fetched, cached and refreshed by `CatalogRows`, which are shared by all the view
+    models showing the same query (see `get_catalog_rows`). The view gets the rows which are not
+    in the cache yet as placeholders, while their page is fetched in a worker thread, so the GUI
+    is never blocked by the DB. The view model tracks what its view shows and prefetches the
+    pages ahead of the scrolling. When the view jumps over the rows (e.g. the scroll bar is
+    dragged), nothing is fetched until it stays at a position for `_settle_time`, so the pages
+    of the intermediate positions are not fetched just to be scrolled away from.
     """
     _styles = Styles
-    
-    def __init__(self, catalog_model, where=None):
+    _placeholder = '…'  # shown in the rows which are being fetched
+    _prefetch_lead_time = 0.5  # seconds of scrolling at the current speed to prefetch for
+    _max_prefetch_pages = 8
+    _scroll_idle_time = 0.3  # seconds without scrolling after which the speed is reset
+    _jump_screens = 2  # moving by more screens of rows at once is a jump
+    _settle_time = 0.04  # seconds the view must stay at a position after a jump to fetch its rows
+    # fields, None
+    _sortIndexCreated = QtCore.pyqtSignal(object, object)
+    # whether the index is available
+    _searchIndexInstalled = QtCore.pyqtSignal(object)
+    # the text, the number of the first row starting with it or None - the result of `find_row`
+    rowFound = QtCore.pyqtSignal(str, object)
+    # whether to create an index when the rows are ordered by columns without one
+    _create_sort_indexes = False
+
+    def __init__(self, catalog_model, where=None, order_by=None, columns=None):
+        """
+        Args:
+            catalog_model: CatalogModel subclass whose items to show
+            where: optional peewee expression to filter the items
+            order_by: fields (or `field.desc()`) by which to order the items; preferably covered
+                by an index
+            columns (Optional[str]): which columns to show, see `parse_columns`; only their fields
+                are fetched
+        """
         assert isinstance(catalog_model, type) and issubclass(catalog_model, CatalogModel), \
             'Pass a CatalogModel subclass'
         super().__init__(None)  # no parent
+        self.columns = parse_columns(catalog_model, columns)
         self.vHeaderStyle = self._styles.VHeaderStyle()  # one style for all rows
         self.hHeaderStyles = []
         self.column_styles = []
-        for field in catalog_model._meta.sorted_fields:
-            self.hHeaderStyles.append(self._styles.HHeaderStyle(field=field))
-            column_style = self._styles.create_style_for_field(field)
+        for column in self.columns:
+            self.hHeaderStyles.append(self._styles.HHeaderStyle(field=column.field))
+            column_style = self._styles.create_style_for_field(column.field)
             self.column_styles.append(column_style)
 
         self._column_count = len(self.column_styles)
+        self._field_names = catalog_model._meta.sorted_field_names  # the order of row values
+        # [{role: (function(item) or None, constant value)}] for each column
+        self._cell_accessors = [
+            make_cell_accessors(style, self._field_names.index(column.field.name), column.deferred)
+            for column, style in zip(self.columns, self.column_styles)]
+        self._deferred_columns = {
+            column_no for column_no, column in enumerate(self.columns) if column.deferred}
+        # the fields fetched with the pages and per row
+        self._fields = [column.field for column in self.columns if not column.deferred]
+        self._deferred_fields = [column.field for column in self.columns if column.deferred]
         self._catalog_model = catalog_model
+        self._base_where = where  # the filter passed by the owner
+        self._where = where  # the base filter combined with the quick filter
+        self._filter_text = ''
+        self._search_fields = get_search_fields(catalog_model)
+        # the rows of a small catalog are kept in memory and filtered there, see `ResidentRows`
+        self._resident = get_resident_table(catalog_model) is not None
+        self._installing_search_index = False
+        self._use_search_index = True  # false if the index can't be built, see `set_filter`
+        self._order_by = make_sort_key(catalog_model, order_by)
+        self._sort_columns = []  # [(column, Qt.SortOrder)] set by clicking header sections
+        self._creating_indexes = set()  # {fields} for which sort indexes are being created
+        self._sortIndexCreated.connect(self._on_sort_index_created)
+        self._searchIndexInstalled.connect(self._on_search_index_installed)
+
+        self._row_count = None  # the count the view knows, None - not asked yet
+        self._visible_rows = (0, -1)  # first and last rows shown by the view
+        self._scroll_time = 0  # when the visible rows were changed last time
+        self._scroll_velocity = 0  # rows per second, negative when scrolling up
+        self._find_text = None  # of the last `find_row`
+        self._jumping = False  # the view jumps over the rows - the missing ones are not fetched
+        self._settle_timer = QtCore.QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(int(self._settle_time * 1000))
+        self._settle_timer.timeout.connect(self._on_scroll_settled)
+        self._rows = None
+        self._set_rows(self._get_rows(where))
+
+    def _get_rows(self, where):
+        """Get the shared rows of the current query with the given filter.
+        """
+        if self._resident:
+            return get_catalog_rows(
+                self._catalog_model, where, self._order_by, None, self._deferred_fields,
+                self._search_fields, self._filter_text)
+        return get_catalog_rows(
+            self._catalog_model, where, self._order_by, self._fields, self._deferred_fields)
+
+    def _set_rows(self, rows):
+        """Show the given shared rows instead of the current ones.
+        """
+        if self._rows is not None:
+            self._rows.remove_view(self)
+        self._rows = rows
+        self._page_size = rows._page_size
+        # used by `data`, which is called very often
+        self._cache = rows._cache
+        self._used_pages = rows._used_pages
+        rows.add_view(self)
+        self._row_count = None
+
+    def _switch_rows(self, where, keep_row_count=False):
+        """Show the rows of the current query, with the given filter.
+
+        Args:
+            where: the new filter
+            keep_row_count (bool): the row count is known to be the same (e.g. only the order of
+                the rows changed)
+        """
+        row_count = self._rows.row_count() if keep_row_count \
+            and self._rows.is_row_count_exact() else None
+        self.beginResetModel()
         self._where = where
+        self._set_rows(self._get_rows(where))
+        if row_count is not None:
+            self._rows.suggest_row_count(row_count)
+        self.endResetModel()
 
-        self._update_period = 5  # seconds
-        self._fetch_count = 150  # number of records to fetch in one db request
-        self._update_timer = QtCore.QTimer(self)  # timer for updating the view
-        self._update_timer.setSingleShot(True)
-        self._update_timer.timeout.connect(self._reset_cache)
-        # orm.signals.post_save.connect(self._resetCache, catalog_model)  # to update the view...
-        # orm.signals.post_delete.connect(self._resetCache, catalog_model)  # ...when a record was modified
-        self._reset_cache()
-
-    def _reset_cache(self, **kwargs):
-        #print('clearCache')
-        self._update_timer.stop()
+    def reset(self):
+        """Drop all the cached rows and the row count, so they are fetched again. The other views
+        showing the same rows are reset too.
+        """
+        self._rows.reset()
+
+    def _on_rows_reset(self):
         self.beginResetModel()
-        self._cache = {}  # {rowNo: (catalogItem, fetch_time)}
         self._row_count = None
         self.endResetModel()
-        self._update_timer.start(self._update_period * 1000)
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        """Order the rows by the given column on the DB side. Called by the view when a header
+        section is clicked. With Shift pressed, the column is added to the current order, so the
+        rows can be ordered by several columns.
+
+        Args:
+            column (int): the column or -1 for the default order (by the primary key)
+        """
+        if column < 0:
+            sort_columns = []
+        elif QtWidgets.QApplication.keyboardModifiers() & QtCore.Qt.ShiftModifier:
+            sort_columns = [(_column, _order) for _column, _order in self._sort_columns
+                            if _column != column]
+            sort_columns.append((column, order))
+        else:
+            sort_columns = [(column, order)]
+        self.set_sort_columns(sort_columns)
+
+    def set_sort_columns(self, sort_columns):
+        """Order the rows by the given columns, regardless of the keyboard modifiers.
+
+        Args:
+            sort_columns: [(column, Qt.SortOrder)], the most significant first
+        """
+        if sort_columns == self._sort_columns:
+            return
+        self._sort_columns = sort_columns
+        fields = [_column.field for _column in self.columns]
+        self.set_order_by([
+            fields[_column].desc() if _order == QtCore.Qt.DescendingOrder else fields[_column]
+            for _column, _order in sort_columns])
+
+    def set_order_by(self, order_by):
+        """Order the rows by the given fields (or their orderings). Only the pages the view shows
+        are fetched in the new order, unless another view already has them.
+        """
+        self._order_by = make_sort_key(self._catalog_model, order_by)
+        self._switch_rows(self._where, keep_row_count=True)
+        if not self._resident:  # the resident rows are sorted in memory
+            self.check_sort_index()
+
+    def check_sort_index(self):
+        """Check whether the current order is supported by an index - otherwise each page fetch
+        sorts the whole table. If it's not, the index is created in background, if
+        `_create_sort_indexes` is set, or the user is told which index to create.
+        """
+        fields = tuple(field for field, _ in self._order_by)
+        catalog_model = self._catalog_model
+        if is_indexed(catalog_model, fields, self._where):
+            return
+        fields = tuple(field for field in fields if not field.primary_key)
+        index = make_index(catalog_model, fields)
+        if not self._create_sort_indexes:
+            print(f'Ordering `{catalog_model.__name__}` by '
+                  f'{", ".join(field.name for field in fields)} is slow - there is no index for '
+                  f'it:\n{get_create_index_sql(catalog_model, index)}')
+            return
+        if fields in self._creating_indexes:
+            return
+        print(f'Creating index for ordering `{catalog_model.__name__}` by '
+              f'{", ".join(field.name for field in fields)}...')
+        self._creating_indexes.add(fields)
+        scheduler.submit(DbTask(
+            functools.partial(create_index, catalog_model, index), self._sortIndexCreated,
+            fields), MAINTENANCE)
+
+    def _on_sort_index_created(self, fields, result):
+        self._creating_indexes.discard(fields)
+        if is_indexed(self._catalog_model, fields, self._where):
+            print(f'Index for ordering `{self._catalog_model.__name__}` by '
+                  f'{", ".join(field.name for field in fields)} was created.')
+
+    def set_filter(self, text):
+        """Show only the rows whose searchable fields (`search_fields` option of the catalog
+        model Meta, by default all CharFields) contain all the words of the text.
+
+        The words are looked up in a full-text search index, which is built in background on the
+        first use. If it can't be built (e.g. SQLite lacks FTS5), the fields are searched with
+        LIKE, which scans the table. An empty text removes the filter.
+        """
+        text = text.strip()
+        if text == self._filter_text:
+            return
+        self._filter_text = text
+        if text and not self._resident and self._use_search_index \
+                and not has_search_index(self._catalog_model):
+            if not self._installing_search_index:
+                self._installing_search_index = True
+                scheduler.submit(DbTask(
+                    functools.partial(
+                        install_search_index, self._catalog_model, self._search_fields),
+                    self._searchIndexInstalled), MAINTENANCE)
+            return  # the filter is applied when the index is ready
+        self._apply_filter()
+
+    def _on_search_index_installed(self, result):
+        self._installing_search_index = False
+        if not result:
+            print(f'Could not build the search index for `{self._catalog_model.__name__}`, '
+                  f'see the log for details. The quick filter will scan the table.')
+            self._use_search_index = False  # don't try again
+        self._apply_filter()
+
+    def _apply_filter(self):
+        if self._resident:
+            # the rows are filtered in memory
+            if self._filter_text != self._rows.filter_text:
+                self._switch_rows(self._base_where)
+            return
+        where = self._base_where
+        if self._filter_text and self._search_fields:
+            condition = search_condition(
+                self._catalog_model, self._search_fields, self._filter_text,
+                self._use_search_index)
+            if condition is not None:
+                where = condition if where is None else where & condition
+        if where is self._where:
+            return
+        self._switch_rows(where)
+
+    def find_row(self, text):
+        """Look up in background the first row whose value of the first sort field starts with
+        the text, and emit `rowFound` with its number; its page is fetched too. The row number
+        is counted with an index-backed `COUNT(*) WHERE field < text` query, which walks only the
+        index, and the page is fetched by keyset seeks from the text, without an OFFSET.
+
+        Returns:
+            bool: whether the rows are ordered by a text field, so the lookup was started
+        """
+        if not isinstance(self._order_by[0][0], peewee.CharField):
+            return False
+        self._find_text = text
+        self._rows.find_row(
+            text, functools.partial(self._on_row_found, self._rows),
+            lambda: text == self._find_text)  # the lookups of the previous texts are dropped
+        return True
+
+    def _on_row_found(self, rows, text, row_no):
+        if rows is self._rows and text == self._find_text:
+            # the rows were not sorted or filtered and no more text was typed in the meantime
+            self.rowFound.emit(text, row_no)
 
     def item(self, row_no):
-        """Get an item from the cache. If it's not in the cache, fetch a range from DB and update the cache.
+        """Get an item from the cache. If it's not in the cache, fetch its page from DB and update
+        the cache.
 
         Args:
             row_no: row number from the view for which to get the item
-        """
-        try:  # find the row in the cache
-            return self._cache[row_no][0]
-        except KeyError:  # fill the cache
-            pass
-        # print('Trying to retrieve row %d', rowNo)
-        self._update_timer.stop()
-        range_start = max(row_no - self._fetch_count // 3, 0)
-        items = self._catalog_model.select().where(
-            self._where).offset(range_start).limit(self._fetch_count)
-
-        now = time.time()
-        expired_time = now - self._update_period
-        cache = self._cache
-        # clean the cache of expired rows
-        for _rowNo in tuple(cache.keys()):
-            if cache[_rowNo][1] <= expired_time:
-                cache.pop(_rowNo)
-        # print('for rowNo, item in enumerate(items, rangeStart):')
-        for _rowNo, item in enumerate(items, range_start):
-            cache[_rowNo] = (item, now)
-        self._update_timer.start(self._update_period * 1000)
-        return cache[row_no][0]
 
-    def data(self, index, role):
-        if index.isValid():
-            style = self.column_styles[index.column()]
-            data = style.data.get(role)
+        Returns:
+            CatalogModel: the item or None, if there is no such row anymore
+        """
+        row = self._rows.get_row(row_no)
+        return None if row is None else self.make_item(row)
 
-            if not hasattr(data, '__call__'): # not a function to call
-                return data
+    def cached_item(self, row_no):
+        """Get an item from the cache without blocking. If its page is not in the cache, request
+        the page fetching in background and return MISSING.
+        """
+        row = self._rows.get_cached_row(row_no)
+        return row if row is None or row is wic.MISSING else self.make_item(row)
 
-            item = self.item(index.row())
-            try:
-                value = getattr(item, style.field_name)
-            except peewee.DoesNotExist:
-                # TODO: use a function to not print duplicate messages
-                print(f"`{style.field_name}` relation does not exist")
-                value = None
+    def make_item(self, row):
+        """Make a catalog item (e.g. for editing) from a cached row. If the rows don't have all
+        the fields (see `parse_columns`), the item is fetched by its primary key.
+        """
+        if self._rows.is_projected():
+            primary_key = self._catalog_model._meta.primary_key
+            return self._catalog_model.get_or_none(
+                primary_key == row[self._field_names.index(primary_key.name)])
+        # the same way peewee makes the items of a query
+        item = self._catalog_model(__no_default__=1, **dict(zip(self._field_names, row)))
+        item._dirty.clear()
+        return item
+
+    def _on_rows_changed(self, first_row, last_row):
+        last_row = min(last_row, self.rowCount(None) - 1)
+        if last_row >= first_row:
+            self.dataChanged.emit(
+                self.index(first_row, 0), self.index(last_row, self._column_count - 1))
+
+    def _on_display_strings_changed(self, rel_models):
+        """The display strings of the items of the given models were dropped.
+        """
+        row_count = self.rowCount(None)
+        for column, style in enumerate(self.column_styles):
+            if getattr(style, 'rel_model', None) in rel_models:
+                # the view will request the strings again
+                for page_no in self.visible_pages():
+                    first_row = page_no * self._page_size
+                    last_row = min(first_row + self._page_size, row_count) - 1
+                    if last_row >= first_row:
+                        self.dataChanged.emit(
+                            self.index(first_row, column), self.index(last_row, column))
+
+    def set_visible_rows(self, first_row, last_row):
+        """Let the model know which rows the view shows. Called by the view when it's scrolled or
+        resized.
+
+        The direction and the speed of scrolling are tracked, and the pages ahead in that
+        direction are prefetched: at least a screen of rows plus the rows the view is expected to
+        scroll through during `_prefetch_lead_time`. When the scrolling stops, so does
+        prefetching. A jump over more than `_jump_screens` screens of rows, and any movement
+        after it until the view settles, defers fetching (see `_on_scroll_settled`).
+        """
+        now = time.monotonic()
+        elapsed = now - self._scroll_time
+        delta = first_row - self._visible_rows[0]
+        self._visible_rows = (first_row, last_row)
+        if not delta:
+            return  # resized or no real movement
+        self._scroll_time = now
+        if self._jumping or abs(delta) > self._jump_screens * (last_row - first_row + 1) \
+                and not self._resident:  # the resident rows are got at once
+            self._jumping = True
+            self._scroll_velocity = 0
+            self._settle_timer.start()  # restarted by each movement
+            return
+        velocity = delta / max(elapsed, 0.001)  # rows per second
+        if elapsed < self._scroll_idle_time and (velocity > 0) == (self._scroll_velocity > 0):
+            velocity = (velocity + self._scroll_velocity) / 2  # smooth
+        self._scroll_velocity = velocity
+
+        page_size = self._page_size
+        lookahead = last_row - first_row + 1 + abs(velocity) * self._prefetch_lead_time
+        page_count = min(math.ceil(lookahead / page_size), self._max_prefetch_pages)
+        if velocity > 0:
+            last_page = (self.rowCount(None) - 1) // page_size
+            first_page = last_row // page_size + 1
+            page_count = min(page_count, last_page - first_page + 1)
+        else:
+            first_page = max(first_row // page_size - page_count, 0)
+            page_count = min(page_count, first_row // page_size - first_page)
+        if page_count > 0:
+            self._rows.request_pages(first_page, page_count, PREFETCH)
+
+    def _on_scroll_settled(self):
+        """The view stayed at a position after a jump - fetch the pages it shows with a single
+        request and let it ask for the rows again, so the references are resolved too.
+        """
+        self._jumping = False
+        first_row, last_row = self._visible_rows
+        last_row = min(last_row, self.rowCount(None) - 1)
+        if last_row < first_row:
+            return
+        first_page = first_row // self._page_size
+        self._rows.request_pages(first_page, last_row // self._page_size - first_page + 1, VISIBLE)
+        self.dataChanged.emit(
+            self.index(first_row, 0), self.index(last_row, self._column_count - 1))
+
+    def visible_pages(self):
+        """Get the numbers of the pages which the view shows.
+        """
+        first_row, last_row = self._visible_rows
+        if last_row < first_row:
+            return range(0)
+        return range(first_row // self._page_size, last_row // self._page_size + 1)
 
-            return data(style, value) # call the function
+    def data(self, index, role):
+        if index.isValid():
+            get_value, value = self._cell_accessors[index.column()].get(role, _NO_ACCESSOR)
+            if get_value is None:  # the same value for all the cells of the column
+                return value
+
+            # `CatalogRows.get_cached_row` inlined
+            page_no, row_offset = divmod(index.row(), self._page_size)
+            rows = self._cache.get(page_no)
+            if rows is None:  # the row is being fetched
+                if self._jumping:  # it's fetched when the view settles
+                    return self._placeholder if role == QtCore.Qt.DisplayRole else None
+                self._rows.request_page(page_no)
+                rows = self._cache.get(page_no)  # the resident rows are got at once
+                if rows is None:
+                    return self._placeholder if role == QtCore.Qt.DisplayRole else None
+            self._used_pages.add(page_no)
+            if row_offset >= len(rows):  # the row disappeared
+                return None
+            value = get_value(rows, row_offset)
+            if value is wic.MISSING:  # the referenced item string or the large value is missing
+                if self._jumping:
+                    pass  # fetched when the view settles
+                elif index.column() in self._deferred_columns:
+                    self._rows.request_deferred_values(page_no, row_offset)
+                else:
+                    self._rows.request_foreign_keys(page_no)
+                    # the items of the resident catalogs are looked up at once
+                    value = get_value(rows, row_offset)
+                    if value is not wic.MISSING:
+                        return value
+                return self._placeholder if role == QtCore.Qt.DisplayRole else None
+            return value
 
     def rowCount(self, parent):
-        _row_count = self._row_count  # cached row count
-        if _row_count is None:  # if it's not filled yet - fetch it from the db
-            _row_count = self._row_count = self._catalog_model.select().where(self._where).count()
+        _row_count = self._row_count  # the count the view knows
+        if _row_count is None:  # if it's not known yet - an estimate, while it's being counted
+            _row_count = self._row_count = self._rows.row_count()
         return _row_count
 
+    def _on_row_count_changed(self, row_count):
+        """Insert or remove the rows at the end, to match the new row count.
+        """
+        old_row_count = self._row_count
+        if old_row_count is None:
+            return  # the view has not asked for the count yet
+        if row_count > old_row_count:
+            self.beginInsertRows(QtCore.QModelIndex(), old_row_count, row_count - 1)
+            self._row_count = row_count
+            self.endInsertRows()
+        elif row_count < old_row_count:
+            self.beginRemoveRows(QtCore.QModelIndex(), row_count, old_row_count - 1)
+            self._row_count = row_count
+            self.endRemoveRows()
+
+    def canFetchMore(self, parent):
+        # there is no estimate of the row count - let the view ask for more rows
+        return self._rows.fetching_more() and not parent.isValid()
+
+    def fetchMore(self, parent):
+        """Fetch the page after the loaded rows. When it arrives, the rows are added.
+        """
+        self._rows.request_page(self.rowCount(parent) // self._page_size)
+
+    def cache_stats(self):
+        """Get the statistics of the page cache: pages, rows, bytes, hits, misses, evictions.
+        """
+        return self._rows.cache_stats()
+
     def columnCount(self, parent):
         return self._column_count
 
@@ -272,3 +823,4 @@ class CatalogViewModel(QtCore.QAbstractTableModel):
             return None
         data = style.data.get(role)
         return data(style, section) if hasattr(data, '__call__') else data
+
@@ -0,0 +1,126 @@
+import threading
+
+import wic
+
+
+class RecordDisplayCache():
+    """Cache of display strings of the catalog items referenced by foreign keys, shared by all the
+    catalog views: {related model: {id: str}}.
+
+    The strings for a whole page of items are resolved at once, with one `IN (...)` query per
+    related model, instead of a query per shown cell. The cache of a related model is cleared when
+    its table change counter differs from the one the strings were fetched at.
+    """
+    def __init__(self, max_records=100000):
+        """
+        Args:
+            max_records (int): maximum number of cached strings per related model; when exceeded,
+                the strings of the model are dropped
+        """
+        self.max_records = max_records
+        self._lock = threading.Lock()  # items are resolved in worker threads
+        self._strings = {}  # {model: {id: str or None, if the item does not exist}}
+        self._change_counters = {}  # {model: change counter}
+
+    def get(self, model, record_id, default=None):
+        """Get the display string of an item.
+
+        Returns:
+            str: the string, None if there is no such item or `default` if it's not cached
+        """
+        if record_id is None:
+            return None
+        return self._strings.get(model, {}).get(record_id, default)
+
+    def resolve(self, rows, foreign_keys):
+        """Fetch and cache the display strings of the items referenced by the given rows.
+
+        Args:
+            rows: list of tuples of field values of catalog items
+            foreign_keys: [(index of the value in a row, ForeignKeyField)]
+        """
+        for column, field in foreign_keys:
+            rel_model = field.rel_model
+            strings = self._strings.get(rel_model, {})
+            record_ids = {row[column] for row in rows}
+            record_ids = {record_id for record_id in record_ids
+                          if record_id is not None and record_id not in strings}
+            if not record_ids:
+                continue
+            fetched = dict.fromkeys(record_ids)  # not found items will be None
+            rel_field = field.rel_field
+            # chunks, not to exceed the limit of SQL variables
+            record_ids = list(record_ids)
+            for i in range(0, len(record_ids), 500):
+                for record in rel_model.select().where(
+                        rel_field.in_(record_ids[i:i + 500])):
+                    fetched[record.__data__[rel_field.name]] = str(record)
+            self.put(rel_model, fetched)
+
+    def resolve_resident(self, rows, foreign_keys):
+        """Cache the display strings of the items referenced by the given rows, looking them up
+        in the tables kept in memory, without querying the database. The tables are not checked
+        for changes here - the catalog rows validate them when their tables change.
+
+        Args:
+            rows: list of tuples of field values of catalog items
+            foreign_keys: [(index of the value in a row, ForeignKeyField, ResidentTable)]
+        """
+        for column, field, table in foreign_keys:
+            table.ensure_loaded()
+            strings = self._strings.get(field.rel_model, {})
+            fetched = {}
+            for row in rows:
+                record_id = row[column]
+                if record_id is not None and record_id not in strings \
+                        and record_id not in fetched:
+                    item = table.get_item(record_id)
+                    fetched[record_id] = None if item is None else str(item)
+            if fetched:
+                self.put(field.rel_model, fetched)
+
+    def put(self, model, strings):
+        """Cache the display strings of the given items: {id: str or None, if there is no such
+        item}.
+        """
+        with self._lock:
+            model_strings = self._strings.setdefault(model, {})
+            if len(model_strings) + len(strings) > self.max_records:
+                model_strings.clear()
+            model_strings.update(strings)
+
+    def validate(self, model, change_counter):
+        """Drop the cached strings of the model, if its table was changed since they were fetched.
+
+        Returns:
+            bool: whether the strings were dropped
+        """
+        with self._lock:
+            if self._change_counters.get(model, wic.MISSING) == change_counter:
+                return False
+            self._change_counters[model] = change_counter
+            self._strings.pop(model, None)
+        return True
+
+    def forget(self, model, record_ids):
+        """Drop the cached strings of the given items, e.g. after they were changed.
+        """
+        with self._lock:
+            strings = self._strings.get(model)
+            if strings:
+                for record_id in record_ids:
+                    strings.pop(record_id, None)
+
+    def invalidate(self, model=None):
+        """Drop the cached strings of the given model or of all the models.
+        """
+        with self._lock:
+            if model is None:
+                self._strings.clear()
+                self._change_counters.clear()
+            else:
+                self._strings.pop(model, None)
+                self._change_counters.pop(model, None)
+
+
+record_display_cache = RecordDisplayCache()
@@ -0,0 +1,135 @@
+import collections
+import sys
+
+
+def estimate_page_size(rows):
+    """Roughly estimate how many bytes the given rows of field values take in memory.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class Page(list):
+    """Rows (tuples of field values) of a page and the display strings of their cells, which are
+    formatted on the first request and kept while the page is cached:
+    {(row_offset, column, role): value}. The values of the large fields, which are fetched lazily,
+    per row, are kept too: {(row_offset, column): value}.
+    """
+    __slots__ = ['display_strings', 'deferred_values']
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.display_strings = {}
+        self.deferred_values = {}
+
+
+class PageCache():
+    """LRU cache of pages of catalog rows, keyed by page number.
+
+    The cache is bounded by the total number of rows and, optionally, by the estimated number of
+    bytes of the cached pages. Lookup, insertion and eviction are O(1) (the bytes estimate is
+    computed once per stored page).
+    """
+    def __init__(self, max_rows=10000, max_bytes=None, sizeof=estimate_page_size):
+        """
+        Args:
+            max_rows (int): maximum number of rows in all cached pages
+            max_bytes (Optional[int]): maximum estimated size of all cached pages
+            sizeof: function which estimates the size in bytes of a list of items
+        """
+        assert max_rows > 0, 'The cache must allow at least one row'
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._pages = collections.OrderedDict()  # {page_no: (items, size)}, the oldest first
+        self.row_count = 0
+        self.byte_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, page_no):
+        """Get the items of a page, marking it as the most recently used.
+
+        Returns:
+            list: the items or None, if the page is not in the cache
+        """
+        try:
+            items = self._pages[page_no][0]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(page_no)
+        return items
+
+    def peek(self, page_no):
+        """Get the items of a page without affecting the statistics and the eviction order.
+        """
+        page = self._pages.get(page_no)
+        return page and page[0]
+
+    def put(self, page_no, items):
+        """Put a page into the cache, evicting the least recently used pages if the budget is
+        exceeded.
+        """
+        self.pop(page_no)
+        size = self._sizeof(items) if self.max_bytes is not None else 0
+        self._pages[page_no] = (items, size)
+        self.row_count += len(items)
+        self.byte_count += size
+        self._evict()
+
+    def pop(self, page_no):
+        """Remove a page from the cache.
+
+        Returns:
+            list: the items of the removed page or None, if it was not in the cache
+        """
+        page = self._pages.pop(page_no, None)
+        if page is None:
+            return None
+        items, size = page
+        self.row_count -= len(items)
+        self.byte_count -= size
+        return items
+
+    def _evict(self):
+        pages = self._pages
+        max_bytes = self.max_bytes
+        # never evict the page which was just put
+        while len(pages) > 1 and (
+                self.row_count > self.max_rows
+                or max_bytes is not None and self.byte_count > max_bytes):
+            page_no = next(iter(pages))
+            self.pop(page_no)
+            self.evictions += 1
+
+    def pages(self):
+        """Get the numbers of the cached pages, the least recently used first.
+        """
+        return list(self._pages)
+
+    def clear(self):
+        """Remove all the pages. The statistics are kept.
+        """
+        self._pages.clear()
+        self.row_count = 0
+        self.byte_count = 0
+
+    def stats(self):
+        """Get the cache statistics.
+        """
+        return dict(
+            pages=len(self._pages), rows=self.row_count, bytes=self.byte_count,
+            hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def __contains__(self, page_no):
+        return page_no in self._pages
+
+    def __len__(self):
+        return len(self._pages)
@@ -0,0 +1,190 @@
+import time
+import weakref
+
+import peewee
+import wic
+
+from wic.db import get_change_counter, estimate_row_count
+
+
+class ResidentTable():
+    """All the rows of a small catalog table, loaded at once and kept in memory in columns, so
+    the catalog views sort and filter them and look up the items by their ids without querying
+    the database.
+
+    The rows are loaded again only when the table change counter (see `wic.db`) shows that the
+    table was modified or, if the counter is not available, at most once per `reload_period`.
+    Must be used from the GUI thread.
+    """
+    max_rows = 10000  # bigger tables are not kept in memory
+    reload_period = 5  # seconds after which the rows are loaded again, if there is no counter
+
+    def __init__(self, catalog_model):
+        self.catalog_model = catalog_model
+        self.change_counter = wic.MISSING  # of the loaded rows
+        self.version = 0  # incremented each time the rows are loaded
+        self._loaded_at = None  # time.monotonic() of the loading
+        self.rows = []  # tuples of the values of all the fields, in the order of the model fields
+        self.columns = []  # [values of a field]
+        self._field_columns = {
+            field.name: column for column, field in enumerate(catalog_model._meta.sorted_fields)}
+        self._pk_column = self._field_columns[catalog_model._meta.primary_key.name]
+        self._positions = {}  # {id: position of the row}
+        self._sort_keys = {}  # {field name: [sort key of each row]}
+        self._search_columns = {}  # {field name: [lower case value of each row]}
+        self._filtered_ids = {}  # {(sql, params): {ids of the rows matching the condition}}
+
+    def validate(self):
+        """Load the rows, if the table was modified since they were loaded.
+
+        Returns:
+            bool: whether the rows were loaded
+        """
+        change_counter = get_change_counter(self.catalog_model)
+        if change_counter is None:
+            # there is no way to know whether the table was modified
+            if self._loaded_at is not None \
+                    and time.monotonic() - self._loaded_at < self.reload_period:
+                return False
+        elif change_counter == self.change_counter:
+            return False
+        # the counter is read before the rows, so a change made in the meantime is not missed
+        self.change_counter = change_counter
+        self._loaded_at = time.monotonic()
+        self.rows = list(self.catalog_model.select().tuples())
+        self.columns = [list(values) for values in zip(*self.rows)] \
+            or [[] for _ in self._field_columns]
+        self._positions = {record_id: position
+                           for position, record_id in enumerate(self.columns[self._pk_column])}
+        self._sort_keys = {}
+        self._search_columns = {}
+        self._filtered_ids = {}
+        self.version += 1
+        return True
+
+    def ensure_loaded(self):
+        """Load the rows, if they were never loaded. Unlike `validate`, doesn't query the change
+        counter, so it can be called when painting the views.
+        """
+        if self._loaded_at is None:
+            self.validate()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_row(self, record_id):
+        """Get the row of an item by its id.
+
+        Returns:
+            tuple: the field values or None, if there is no such item
+        """
+        position = self._positions.get(record_id)
+        return None if position is None else self.rows[position]
+
+    def get_item(self, record_id):
+        """Get an item by its id.
+
+        Returns:
+            CatalogModel: the item or None, if there is no such item
+        """
+        row = self.get_row(record_id)
+        if row is None:
+            return None
+        item = self.catalog_model(
+            __no_default__=1, **dict(zip(self.catalog_model._meta.sorted_field_names, row)))
+        item._dirty.clear()
+        return item
+
+    def filter(self, where=None, search_fields=(), text=''):
+        """Get the positions of the rows matching the condition and containing all the words of
+        the text (see `wic.db.search_condition`, the words are matched the same way).
+
+        Args:
+            where: peewee expression; the ids of the matching rows are queried once per loaded
+                rows
+            search_fields: the fields in which to look for the words
+            text: the words to look for
+
+        Returns:
+            list: the positions
+        """
+        positions = range(len(self.rows))
+        if where is not None:
+            ids = self._get_filtered_ids(where)
+            record_ids = self.columns[self._pk_column]
+            positions = [position for position in positions if record_ids[position] in ids]
+        for word in text.lower().split():
+            columns = [self._get_search_column(field) for field in search_fields]
+            if len(word) >= 3:
+                positions = [position for position in positions
+                             if any(word in column[position] for column in columns)]
+            else:
+                positions = [position for position in positions
+                             if any(column[position].startswith(word) for column in columns)]
+        return list(positions)
+
+    def sort(self, positions, sort_key):
+        """Sort the positions of the rows in place the way SQLite orders them (NULLs first).
+
+        Args:
+            positions: list of the row positions
+            sort_key: ((field, descending), ...), see `make_sort_key`
+        """
+        # the sort is stable, so sorting by the least significant field first gives the order
+        for field, descending in reversed(sort_key):
+            positions.sort(key=self._get_sort_keys(field).__getitem__, reverse=descending)
+
+    def _get_filtered_ids(self, where):
+        primary_key = self.catalog_model._meta.primary_key
+        query = self.catalog_model.select(primary_key).where(where)
+        sql, params = query.sql()
+        key = (sql, tuple(params))
+        ids = self._filtered_ids.get(key)
+        if ids is None:
+            ids = self._filtered_ids[key] = {record_id for record_id, in query.tuples()}
+        return ids
+
+    def _get_sort_keys(self, field):
+        keys = self._sort_keys.get(field.name)
+        if keys is None:
+            keys = self.columns[self._field_columns[field.name]]
+            if field.null:
+                keys = [(value is not None, value) for value in keys]
+            self._sort_keys[field.name] = keys
+        return keys
+
+    def _get_search_column(self, field):
+        column = self._search_columns.get(field.name)
+        if column is None:
+            column = self._search_columns[field.name] = [
+                '' if value is None else str(value).lower()
+                for value in self.columns[self._field_columns[field.name]]]
+        return column
+
+
+_resident_tables = weakref.WeakKeyDictionary()  # {catalog model: ResidentTable or None}
+
+
+def get_resident_table(catalog_model):
+    """Get the table of the catalog model kept in memory, if the model is small enough.
+
+    The catalog model Meta option `resident` keeps its table in memory (True) or not (False)
+    regardless of its size. Otherwise the tables which have no more than `ResidentTable.max_rows`
+    rows and have no large fields (e.g. long texts) are kept in memory. The decision is made
+    once per model.
+
+    Returns:
+        ResidentTable: the table or None, if the model is not resident
+    """
+    try:
+        return _resident_tables[catalog_model]
+    except KeyError:
+        pass
+    resident = getattr(catalog_model._meta, 'resident', None)
+    if resident is None:
+        row_count = estimate_row_count(catalog_model)
+        resident = row_count is not None and row_count <= ResidentTable.max_rows and not any(
+            isinstance(field, (peewee.TextField, peewee.BlobField))
+            for field in catalog_model._meta.sorted_fields)
+    table = _resident_tables[catalog_model] = ResidentTable(catalog_model) if resident else None
+    return table
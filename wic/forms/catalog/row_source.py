@@ -0,0 +1,1130 @@
+import functools, logging, time, weakref
+
+from PyQt5 import QtCore
+import peewee
+import wic
+
+from wic.db import (
+    get_change_counter, estimate_row_count, add_change_listener, remove_change_listener,
+    install_change_log, has_change_log, get_change_log_readers, CancellationToken)
+from wic.scheduler import DbTask, scheduler, VISIBLE, SELECTION, PREFETCH, COUNT, REFRESH
+from .page_cache import Page, PageCache
+from .display_cache import record_display_cache
+from .resident_table import get_resident_table
+
+
+def make_sort_key(catalog_model, order_by=None):
+    """Make the description of the rows order.
+
+    Args:
+        catalog_model: CatalogModel subclass
+        order_by: iterable of fields or their orderings (`field.desc()`)
+
+    Returns:
+        tuple: ((field, descending), ...) always ending with the primary key, so the order is
+            deterministic; the primary key goes in the direction of the last field, so a single
+            direction order can be seeked with a row value comparison (see `seek_condition`)
+    """
+    primary_key = catalog_model._meta.primary_key
+    sort_key = []
+    for node in order_by or ():
+        if isinstance(node, peewee.Ordering):
+            field, descending = node.node, node.direction == 'DESC'
+        else:
+            field, descending = node, False
+        assert isinstance(field, peewee.Field), 'Pass model fields or their orderings'
+        if field is primary_key:
+            sort_key.append((field, descending))
+            break  # the primary key is unique - next fields do not matter
+        sort_key.append((field, descending))
+    else:
+        sort_key.append((primary_key, sort_key[-1][1] if sort_key else False))
+    return tuple(sort_key)
+
+
+def get_sort_key(row, sort_key):
+    """Get the values of the given sort key fields from a fetched row (raw values of all the model
+    fields, so foreign keys are not resolved).
+    """
+    field_names = sort_key[0][0].model._meta.sorted_field_names
+    return tuple(row[field_names.index(field.name)] for field, _ in sort_key)
+
+
+def order_clause(sort_key, reverse=False):
+    """Make ORDER BY expressions for the given sort key.
+    """
+    return [field.desc() if descending != reverse else field.asc()
+            for field, descending in sort_key]
+
+
+def seek_condition(sort_key, key_values, forward=True):
+    """Make WHERE condition which selects the rows going after (or before, if not `forward`)
+    the row with the given sort key values.
+
+    When all the fields have the same sort direction and can't be NULL, the condition is a row
+    value comparison `(a, b) > (?, ?)`, which SQLite plans as a search in an index on the fields.
+    Otherwise it's expanded: `a > ? OR (a = ? AND b > ?)`, which SQLite can't use to search an
+    index, so the rows before the seeked one are skipped. SQLite sorts NULLs first.
+    """
+    directions = {descending for _, descending in sort_key}
+    if len(directions) == 1 and not any(field.null for field, _ in sort_key):
+        fields = peewee.Tuple(*(field for field, _ in sort_key))
+        values = peewee.Tuple(*(peewee.Value(value, converter=field.db_value)
+                                for (field, _), value in zip(sort_key, key_values)))
+        return fields > values if forward != directions.pop() else fields < values
+    condition = None  # None means that no row goes after
+    for (field, descending), value in reversed(tuple(zip(sort_key, key_values))):
+        if forward != descending:  # the values are increasing
+            after = field.is_null(False) if value is None else field > value
+        else:
+            after = None if value is None else (field < value) | field.is_null()
+        if condition is not None:
+            same = field.is_null() if value is None else field == value
+            condition = same & condition if after is None else after | (same & condition)
+        else:
+            condition = after
+    if condition is None:
+        # the key is the smallest/largest possible - nothing goes after it
+        condition = peewee.SQL('0')
+    return condition
+
+
+def get_foreign_keys(catalog_model):
+    """Get the foreign keys of the model with their indexes in the rows of field values.
+
+    Returns:
+        list: [(column, ForeignKeyField)]
+    """
+    return [(column, field) for column, field in enumerate(catalog_model._meta.sorted_fields)
+            if isinstance(field, peewee.ForeignKeyField)]
+
+
+def make_selection(catalog_model, fields, sort_key):
+    """Make the columns of the page queries, which fetch only the given fields, the primary key
+    and the sort key fields. The rows keep the layout of all the model fields: the fields which
+    are not fetched are selected as NULL.
+
+    Args:
+        catalog_model: CatalogModel subclass
+        fields: the fields to fetch or None for all the fields
+        sort_key: the rows order, see `make_sort_key`
+
+    Returns:
+        list: the columns to select or None, if all the fields are fetched
+    """
+    if fields is None:
+        return None
+    field_names = {field.name for field in fields}
+    field_names.add(catalog_model._meta.primary_key.name)
+    field_names.update(field.name for field, _ in sort_key)
+    sorted_fields = catalog_model._meta.sorted_fields
+    if all(field.name in field_names for field in sorted_fields):
+        return None
+    return [field if field.name in field_names else peewee.SQL('NULL') for field in sorted_fields]
+
+
+def fetch_rows(query, reverse=False, foreign_keys=None):
+    """Execute the query and get the list of its rows - tuples of raw field values, which are
+    much lighter than model instances. The display strings of the items referenced by their
+    foreign keys (all of them by default) are resolved too.
+    """
+    rows = list(query.tuples())
+    if reverse:
+        rows.reverse()
+    if foreign_keys is None:
+        foreign_keys = get_foreign_keys(query.model)
+    record_display_cache.resolve(rows, foreign_keys)
+    return rows
+
+
+def get_prefix_variants(text):
+    """Get the variants of the typed text to look for: as typed, with the first letter in upper
+    case, capitalized, upper and lower case, without repetitions.
+    """
+    variants = [text, text[:1].upper() + text[1:], text.capitalize(), text.upper(), text.lower()]
+    return [variant for i, variant in enumerate(variants) if variant not in variants[:i]]
+
+
+def find_prefix(query, sort_key, text, page_size, foreign_keys=None):
+    """Find the first row of the query, ordered by the sort key, whose value of the first sort key
+    field starts with the text (see `get_prefix_variants`), and fetch the page with the row.
+
+    The row number is the count of the rows going before the text, and the page is fetched by
+    seeking from the text in both directions, so with an index on the field the cost doesn't
+    depend on the position of the row or on the size of the table.
+
+    Returns:
+        tuple: (row number, page number, page rows) or None, if no row starts with the text
+    """
+    field, descending = sort_key[0]
+    for prefix in get_prefix_variants(text):
+        upper = prefix + '\U0010ffff'  # greater than any text starting with the prefix
+        if query.where(field >= prefix, field < upper).exists():
+            break
+    else:
+        return None
+    # SQLite sorts NULLs first
+    if descending:
+        before = field > upper
+        after = field <= upper
+        if field.null:
+            after = after | field.is_null()
+    else:
+        before = field < prefix
+        after = field >= prefix
+        if field.null:
+            before = before | field.is_null()
+    row_no = query.where(before).count()
+    page_no, row_offset = divmod(row_no, page_size)
+    rows = []
+    if row_offset:
+        rows = fetch_rows(
+            query.where(before).order_by(*order_clause(sort_key, reverse=True)).limit(row_offset),
+            True, foreign_keys)
+    rows += fetch_rows(
+        query.where(after).order_by(*order_clause(sort_key)).limit(page_size - row_offset),
+        False, foreign_keys)
+    return row_no, page_no, rows
+
+
+class CatalogRows(QtCore.QObject):
+    """Rows of a catalog query (model, filter and order), shared by all the view models which
+    show them, so the catalog forms and the item selectors opened on the same query fetch,
+    count and refresh its rows once.
+
+    Rows are fetched in pages of `_page_size` rows and kept in an LRU cache. The rows are always
+    ordered by the sort key fields followed by the primary key, so the order is deterministic and
+    a page can be fetched by seeking from the boundary row of a cached neighbour page
+    (`WHERE id > last_id`) instead of making the database skip all the preceding rows with OFFSET.
+
+    The changes of the rows are learnt from the change log (see `ChangeFeed`), which tells which
+    rows were changed by this or other processes, so only the affected pages are refetched.
+    If the log can't be installed (e.g. the database is read-only), every `_update_period`
+    seconds the table change counter is checked (see `wic.db`), and only if the table was
+    modified, the row count and the pages used by the views are refetched.
+
+    Only the fields the views show may be fetched (see `make_selection`), and the values of the
+    large fields (e.g. long texts) are fetched lazily, per row, when a view needs them (see
+    `request_deferred_values`).
+
+    Use `get_catalog_rows` to get the shared instance for a query.
+    """
+    _cache_max_rows = 10000  # memory budget of the page cache
+    _cache_max_bytes = None  # optional estimated bytes budget
+    _page_size = 150  # number of rows to fetch in one db request
+    _prefetch_distance = 8  # number of pages from the shown ones a prefetched page is dropped at
+    _update_period = 5  # seconds
+    _keep_alive = 60  # seconds to keep the rows cached after the last view is gone
+    _query_time_budget = 30  # seconds a background query may run before it's aborted
+    # generation, first page_no, page count, rows - emitted from a worker thread
+    _pagesFetched = QtCore.pyqtSignal(int, int, int, object)
+    # generation, page_no, None
+    _foreignKeysResolved = QtCore.pyqtSignal(int, int, object)
+    # generation, row count
+    _rowsCounted = QtCore.pyqtSignal(int, object)
+    # generation, text, function to call with the result, (row_no, page_no, rows) or None
+    _prefixFound = QtCore.pyqtSignal(int, str, object, object)
+    # generation, page_no, row_offset, record id, [values of the deferred fields]
+    _deferredValuesFetched = QtCore.pyqtSignal(int, int, int, object, object)
+    # model, operation, record ids - emitted by a change listener, maybe from a worker thread
+    _changesReported = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, catalog_model, where, sort_key, fields=None, deferred_fields=()):
+        """
+        Args:
+            catalog_model: CatalogModel subclass whose items to fetch
+            where: peewee expression to filter the items or None
+            sort_key: the rows order, see `make_sort_key`
+            fields: the fields to fetch with the pages or None for all the fields
+            deferred_fields: the large fields, which are not fetched with the pages, but per row
+        """
+        super().__init__(None)  # no parent
+        self.catalog_model = catalog_model
+        self.where = where
+        self.sort_key = sort_key
+        self.deferred_fields = tuple(deferred_fields)
+        self._selection = make_selection(catalog_model, fields, sort_key) or ()
+        meta = catalog_model._meta
+        self._pk_column = meta.sorted_field_names.index(meta.primary_key.name)  # in the rows
+        # in the registry
+        self.key = make_rows_key(catalog_model, where, sort_key, fields, deferred_fields)
+        self._views = weakref.WeakSet()  # view models showing the rows
+        self._idle_since = None  # when the last view was gone
+        self._generation = 0  # incremented when the fetched pages become outdated
+        self._cache = PageCache(self._cache_max_rows, self._cache_max_bytes)
+        self._pending_pages = {}  # {page_no: DbRequest} of the pages being fetched in background
+        self._stale_pages = set()  # cached pages with outdated content, which are being refetched
+        self._tokens = weakref.WeakSet()  # cancellation tokens of the background queries
+        self._used_pages = set()  # pages used by the views since the last refresh
+        self._row_count = None  # exact or estimated, None - not known yet
+        self._row_count_exact = False
+        self._fetching_more = False  # no estimate - the rows are added as they are fetched
+        self._resolving_pages = set()  # pages whose foreign keys are being resolved
+        self._fetching_deferred = set()  # (page_no, row_offset) whose deferred values are fetched
+        self._pagesFetched.connect(self._on_pages_fetched)
+        self._rowsCounted.connect(self._on_rows_counted)
+        self._deferredValuesFetched.connect(self._on_deferred_values_fetched)
+        self._prefixFound.connect(self._on_prefix_found)
+        self._foreign_keys = []
+        self._resident_foreign_keys = []  # the referenced items are looked up in memory
+        for column, field in get_foreign_keys(catalog_model):
+            if self._selection and self._selection[column] is not field:
+                continue  # not fetched
+            table = get_resident_table(field.rel_model)
+            if table is None:
+                self._foreign_keys.append((column, field))
+            else:
+                self._resident_foreign_keys.append((column, field, table))
+        self._foreignKeysResolved.connect(self._on_foreign_keys_resolved)
+        # change counters of the related tables, to know when their display strings are outdated
+        self._related_counters = {}
+        for field in [field for _, field in self._foreign_keys] \
+                + [field for _, field, _ in self._resident_foreign_keys]:
+            rel_model = field.rel_model
+            install_change_log(rel_model)
+            self._related_counters[rel_model] = get_change_counter(rel_model)
+            record_display_cache.validate(rel_model, self._related_counters[rel_model])
+            self._validate_resident_table(rel_model)
+        # read before fetching anything, so a change made in the meantime is not missed
+        install_change_log(catalog_model)
+        self._change_counter = get_change_counter(catalog_model)
+        ChangeFeed.start()
+        self._update_timer = QtCore.QTimer(self)  # timer for checking the table changes
+        self._update_timer.timeout.connect(self._refresh)
+        self._update_timer.start(self._update_period * 1000)
+        # the changes made by this process are applied at once, without waiting for the timer;
+        # queued - a transaction in progress is committed by the time the event is processed
+        self._changesReported.connect(self._on_changes_reported, QtCore.Qt.QueuedConnection)
+        self._change_listener = self._changesReported.emit
+        add_change_listener(self._change_listener)
+
+    def add_view(self, view_model):
+        """Start notifying the view model about the changes of the rows.
+        """
+        if self._idle_since is not None:
+            self._idle_since = None
+            self._refresh()  # the table might have been changed while the rows were not shown
+        self._views.add(view_model)
+
+    def remove_view(self, view_model):
+        """Stop notifying the view model. The rows stay cached for `_keep_alive` seconds after
+        the last view is removed, so reopening a form or a selector does not fetch them again.
+        """
+        self._views.discard(view_model)
+
+    def _release(self):
+        """Remove the rows from the registry, so they are freed.
+        """
+        self._update_timer.stop()
+        self._cancel_queries()
+        remove_change_listener(self._change_listener)
+        if _shared_rows.get(self.key) is self:
+            del _shared_rows[self.key]
+
+    def reset(self):
+        """Drop all the cached rows and the row count, so the views fetch them again.
+        """
+        self._cache.clear()
+        self._pending_pages = {}
+        self._stale_pages = set()
+        self._used_pages.clear()
+        self._resolving_pages = set()
+        self._fetching_deferred = set()
+        self._generation += 1  # pages fetched before the reset will be ignored
+        self._cancel_queries()
+        self._row_count = None
+        self._row_count_exact = False
+        self._fetching_more = False
+        for view_model in list(self._views):
+            view_model._on_rows_reset()
+
+    def _refresh(self):
+        """Check whether the table was modified and if so, update the views.
+        """
+        if not self._views:
+            now = time.monotonic()
+            if self._idle_since is None:
+                self._idle_since = now
+            elif now - self._idle_since > self._keep_alive:
+                self._release()
+            return  # nobody shows the rows - they are checked when a view is added
+
+        if not has_change_log(self.catalog_model):  # otherwise the changes are reported
+            change_counter = get_change_counter(self.catalog_model)
+            if change_counter is None:
+                self._invalidate()  # there is no way to know whether anything was changed
+            elif change_counter != self._change_counter:
+                self._change_counter = change_counter
+                self._invalidate()
+
+        # check whether the display strings of the referenced items are outdated
+        changed_models = set()
+        for rel_model, change_counter in self._related_counters.items():
+            if has_change_log(rel_model):
+                continue
+            new_change_counter = get_change_counter(rel_model)
+            if new_change_counter is None:
+                record_display_cache.invalidate(rel_model)
+            elif new_change_counter != change_counter:
+                record_display_cache.validate(rel_model, new_change_counter)
+            else:
+                continue
+            self._related_counters[rel_model] = new_change_counter
+            self._validate_resident_table(rel_model)
+            changed_models.add(rel_model)
+        if changed_models:
+            for view_model in list(self._views):
+                view_model._on_display_strings_changed(changed_models)
+
+    def _invalidate(self, is_affected=None, recount=True):
+        """Update the views after the table was modified.
+
+        The row count is fetched again in background and the rows are inserted or removed at the
+        end when it arrives. The pages which were used since the last refresh and the ones the
+        views show (an idle view doesn't request the rows it shows) are refetched, keeping the
+        old content until the new one arrives, and the views are notified only about the rows
+        which actually changed. The other pages are dropped from the cache.
+
+        Args:
+            is_affected: function(page_no, rows) telling whether a cached page might be
+                outdated; all the pages by default
+            recount (bool): whether to count the rows again
+        """
+        used_pages = self._used_pages | set(self._pending_pages)
+        visible_pages = self._get_visible_pages()
+        used_pages.update(visible_pages)
+        self._used_pages.clear()
+        self._pending_pages = {}
+        self._resolving_pages = set()
+        self._fetching_deferred = set()
+        self._generation += 1  # the pages being fetched might be outdated
+        self._cancel_queries()
+
+        if recount and self._row_count is not None:
+            # the current count is used as an estimate until the new one arrives
+            self._row_count_exact = False
+            self._request_row_count()
+
+        for page_no in self._cache.pages():
+            if is_affected is not None and page_no not in self._stale_pages \
+                    and not is_affected(page_no, self._cache.peek(page_no)):
+                continue
+            if page_no not in used_pages:
+                self._cache.pop(page_no)
+                self._stale_pages.discard(page_no)
+            else:
+                self._stale_pages.add(page_no)
+        for page_no in sorted(used_pages):
+            self.request_page(page_no, VISIBLE if page_no in visible_pages else REFRESH)
+
+    def _on_changes_reported(self, model, operation, record_ids):
+        """A change was made by this process.
+        """
+        if has_change_log(model):
+            ChangeFeed.poll(force=True)  # the change is read from the log with the others
+        else:
+            self.apply_changes(model, operation, record_ids)
+
+    def apply_changes(self, model, operation, record_ids):
+        """Apply a change of the given model table: refetch only the affected pages, if the rows
+        positions can be worked out, and fix the row count without counting the rows.
+
+        Args:
+            model: the changed model, maybe not the one of these rows
+            operation: 'insert', 'update' or 'delete'
+            record_ids: primary keys of the changed rows or None, if they are not known
+        """
+        logged = has_change_log(model)  # all the changes are reported
+        if model in self._related_counters:
+            # the display strings of the referenced items
+            if record_ids is None:
+                record_display_cache.invalidate(model)
+            else:
+                record_display_cache.forget(model, record_ids)
+            self._validate_resident_table(model)
+            if not logged:
+                self._related_counters[model] = self._expect_changes(
+                    model, self._related_counters[model], record_ids)
+            for view_model in list(self._views):
+                view_model._on_display_strings_changed({model})
+        if model is not self.catalog_model:
+            return
+        if not logged:
+            expected_counter = self._expect_changes(model, self._change_counter, record_ids)
+            if expected_counter == self._change_counter:
+                # there were other changes too - don't miss them
+                self._change_counter = get_change_counter(model)
+                self._invalidate()
+                return
+            self._change_counter = expected_counter
+
+        primary_key = model._meta.primary_key
+        sort_key = self.sort_key
+        if record_ids is None or self.where is not None or sort_key[0][0] is not primary_key \
+                or self._row_count is None or self._fetching_more:
+            # the positions of the changed rows or whether they are shown are not known
+            self._invalidate()
+            return
+        # the rows are ordered by the primary key, so the pages with the changed rows or after them
+        # (the rows there move when a row is inserted or deleted) are worked out from their keys
+        pk_column = self.catalog_model._meta.sorted_field_names.index(primary_key.name)
+        descending = sort_key[0][1]
+        if operation == 'update':
+            record_ids = set(record_ids)
+
+            def is_affected(page_no, rows):
+                return any(row[pk_column] in record_ids for row in rows)
+        else:
+            first_id = max(record_ids) if descending else min(record_ids)
+
+            def is_affected(page_no, rows):
+                if len(rows) < self._page_size:
+                    return True  # the last page - the rows may be added to it
+                last_id = rows[-1][pk_column]
+                return last_id <= first_id if descending else last_id >= first_id
+        # the count goes first: the affected pages near the end are fetched counting from it
+        if operation == 'insert':
+            self._set_row_count(self._row_count + len(record_ids))
+        elif operation == 'delete':
+            self._set_row_count(max(self._row_count - len(record_ids), 0))
+        self._invalidate(is_affected, recount=False)
+
+    def _validate_resident_table(self, rel_model):
+        """Load the referenced items of the given model again, if they are kept in memory and
+        their table was modified.
+        """
+        for _, field, table in self._resident_foreign_keys:
+            if field.rel_model is rel_model:
+                table.validate()
+                return
+
+    @staticmethod
+    def _expect_changes(model, change_counter, record_ids):
+        """Get the change counter of the model after the reported change of the given rows, if
+        it matches the current one (i.e. the table was not changed in another way meanwhile).
+        Otherwise the given counter is returned, so the next check finds the table changed.
+        """
+        if record_ids is None or change_counter is None:
+            return change_counter
+        new_change_counter = get_change_counter(model)
+        # the triggers count each changed row
+        if new_change_counter == change_counter + len(record_ids):
+            return new_change_counter
+        return change_counter
+
+    def get_row(self, row_no):
+        """Get a row from the cache. If it's not in the cache, fetch its page from DB and update
+        the cache.
+
+        Returns:
+            tuple: the field values or None, if there is no such row anymore
+        """
+        page_no, row_offset = divmod(row_no, self._page_size)
+        rows = self._cache.get(page_no)  # find the page in the cache
+        if rows is None:  # fill the cache
+            query, reverse = self._make_page_query(page_no)
+            rows = Page(fetch_rows(query, reverse, self._foreign_keys))
+            self._cache.put(page_no, rows)
+        self._used_pages.add(page_no)
+        # the page may be shorter if some rows were deleted since the row count was fetched
+        return rows[row_offset] if row_offset < len(rows) else None
+
+    def get_cached_row(self, row_no):
+        """Get a row from the cache without blocking. If its page is not in the cache, request
+        the page fetching in background and return MISSING.
+        """
+        page_no, row_offset = divmod(row_no, self._page_size)
+        rows = self._cache.get(page_no)
+        if rows is None:
+            self.request_page(page_no, SELECTION)
+            return wic.MISSING
+        self._used_pages.add(page_no)
+        return rows[row_offset] if row_offset < len(rows) else None
+
+    def _make_token(self, description):
+        """Make a cancellation token for a background query, so it's aborted when its result is
+        not needed anymore, when it runs too long or when the user cancels it.
+        """
+        token = CancellationToken(
+            self.catalog_model._meta.database, f'{self.catalog_model.__name__}: {description}',
+            self._query_time_budget)
+        self._tokens.add(token)
+        return token
+
+    def _cancel_queries(self):
+        """Abort the background queries, whose results would be ignored.
+        """
+        for token in list(self._tokens):
+            token.cancel()
+        self._tokens = weakref.WeakSet()
+
+    def _get_visible_pages(self):
+        """Get the numbers of the pages the views show.
+        """
+        visible_pages = set()
+        for view_model in list(self._views):
+            visible_pages.update(view_model.visible_pages())
+        return visible_pages
+
+    def _is_shown(self, first_page, page_count, distance=0):
+        """Check whether a view shows any of the given pages, or the pages are the ones after
+        the loaded rows (see `fetching_more`). If no view tells which rows it shows, the pages
+        are considered shown.
+
+        Args:
+            first_page (int): the first page number
+            page_count (int): the number of pages
+            distance (int): the number of pages around the shown ones which count as shown too
+        """
+        visible_pages = self._get_visible_pages()
+        if not visible_pages or self._fetching_more \
+                and (first_page + page_count) * self._page_size > self._row_count:
+            return True
+        return any(page_no in visible_pages
+                   for page_no in range(first_page - distance, first_page + page_count + distance))
+
+    def request_page(self, page_no, priority=VISIBLE):
+        """Request fetching the given page in a worker thread. The views are notified about the
+        page rows when it arrives.
+        """
+        self.request_pages(page_no, 1, priority)
+
+    def request_pages(self, first_page, page_count, priority=VISIBLE):
+        """Request fetching in a worker thread the given run of pages, which are not cached or
+        pending yet. A contiguous run of missing pages is fetched with a single query.
+
+        Args:
+            first_page (int): the first page number
+            page_count (int): the number of pages
+            priority (int): the priority class of the request (see `wic.scheduler`); a visible
+                page request is dropped, if the page is scrolled out of view before it's run;
+                a pending request is promoted, if it's requested with a higher priority
+        """
+        for page_no in range(first_page, first_page + page_count):
+            request = self._pending_pages.get(page_no)
+            if request is not None and request.priority > priority:
+                scheduler.promote(request, priority)
+        page_nos = [
+            page_no for page_no in range(first_page, first_page + page_count)
+            if page_no not in self._pending_pages
+            and (page_no not in self._cache or page_no in self._stale_pages)]
+        while page_nos:
+            # split into contiguous runs
+            run_length = 1
+            while run_length < len(page_nos) \
+                    and page_nos[run_length] == page_nos[0] + run_length:
+                run_length += 1
+            first_page = page_nos[0]
+            del page_nos[:run_length]
+            query, reverse = self._make_page_query(first_page, run_length)
+            request = scheduler.submit(
+                DbTask(functools.partial(fetch_rows, query, reverse, self._foreign_keys),
+                       self._pagesFetched, self._generation, first_page, run_length,
+                       token=self._make_token('fetching rows')),
+                priority, functools.partial(
+                    self._is_page_request_needed, self._generation, first_page, run_length))
+            if request.state == 'queued' or request.state == 'running':
+                self._pending_pages.update(
+                    dict.fromkeys(range(first_page, first_page + run_length), request))
+
+    def _is_page_request_needed(self, generation, first_page, page_count):
+        if generation != self._generation:
+            return False
+        request = self._pending_pages.get(first_page)
+        if request is None:
+            return True
+        if request.priority == VISIBLE:
+            return self._is_shown(first_page, page_count)
+        if request.priority == PREFETCH:
+            return self._is_shown(first_page, page_count, self._prefetch_distance)
+        return True  # e.g. the selection or a refresh is not superseded by scrolling
+
+    def request_foreign_keys(self, page_no):
+        """Start resolving in a worker thread the display strings of the items referenced by the
+        rows of the given page - they were not in the cache or were invalidated. The items of the
+        resident catalogs (see `ResidentTable`) are looked up in memory at once.
+        """
+        rows = self._cache.peek(page_no)
+        if not rows or page_no in self._resolving_pages:
+            return
+        if self._resident_foreign_keys:
+            record_display_cache.resolve_resident(rows, self._resident_foreign_keys)
+            if not self._foreign_keys:
+                return
+        self._resolving_pages.add(page_no)
+        generation = self._generation
+        scheduler.submit(
+            DbTask(functools.partial(record_display_cache.resolve, rows, self._foreign_keys),
+                   self._foreignKeysResolved, generation, page_no,
+                   token=self._make_token('resolving references')),
+            VISIBLE, lambda: generation == self._generation and self._is_shown(page_no, 1))
+
+    def request_deferred_values(self, page_no, row_offset):
+        """Start fetching in a worker thread the values of the deferred fields of a cached row.
+        The views are notified about the row when they arrive.
+        """
+        rows = self._cache.peek(page_no)
+        if not self.deferred_fields or not rows or row_offset >= len(rows) \
+                or (page_no, row_offset) in self._fetching_deferred:
+            return
+        self._fetching_deferred.add((page_no, row_offset))
+        primary_key = self.catalog_model._meta.primary_key
+        record_id = rows[row_offset][self._pk_column]
+        query = self.catalog_model.select(*self.deferred_fields).where(primary_key == record_id)
+        generation = self._generation
+        scheduler.submit(
+            DbTask(lambda: list(query.tuples()), self._deferredValuesFetched,
+                   generation, page_no, row_offset, record_id,
+                   token=self._make_token('fetching large values')),
+            VISIBLE, lambda: generation == self._generation and self._is_shown(page_no, 1))
+
+    def _on_deferred_values_fetched(self, generation, page_no, row_offset, record_id, rows):
+        if generation != self._generation:
+            return
+        self._fetching_deferred.discard((page_no, row_offset))
+        page = self._cache.peek(page_no)
+        if rows is None or not page or row_offset >= len(page) \
+                or page[row_offset][self._pk_column] != record_id:
+            return  # failed, dropped or the row has moved
+        values = rows[0] if rows else [None] * len(self.deferred_fields)  # the row was deleted
+        field_names = self.catalog_model._meta.sorted_field_names
+        for field, value in zip(self.deferred_fields, values):
+            page.deferred_values[row_offset, field_names.index(field.name)] = value
+        first_row = page_no * self._page_size + row_offset
+        self._notify_rows_changed(first_row, first_row)
+
+    def find_row(self, text, done, is_needed=None):
+        """Start looking up in a worker thread the first row whose value of the first sort key
+        field (a text one) starts with the text (see `find_prefix`). The page with the row is
+        fetched too.
+
+        Args:
+            text: the text to look for
+            done: function to call with the text and the row number or None, if there is no
+                such row or the lookup failed
+            is_needed: function telling whether the lookup must still be run, e.g. more
+                characters were not typed yet
+        """
+        generation = self._generation
+        query = self.catalog_model.select(*self._selection).where(self.where)
+        scheduler.submit(
+            DbTask(functools.partial(find_prefix, query, self.sort_key, text, self._page_size,
+                                     self._foreign_keys),
+                   self._prefixFound, generation, text, done,
+                   token=self._make_token('looking up rows')),
+            VISIBLE, is_needed)
+
+    def _on_prefix_found(self, generation, text, done, result):
+        if generation != self._generation or result is None:
+            done(text, None)
+            return
+        row_no, page_no, rows = result
+        if page_no not in self._cache and page_no not in self._pending_pages:
+            self._notify_rows_changed(*self._store_page(page_no, rows))
+        done(text, row_no)
+
+    def is_projected(self):
+        """Whether the rows don't have the values of all the fields.
+        """
+        return bool(self._selection)
+
+    def _on_foreign_keys_resolved(self, generation, page_no, result):
+        if generation != self._generation:
+            return
+        self._resolving_pages.discard(page_no)
+        first_row = page_no * self._page_size
+        self._notify_rows_changed(first_row, first_row + self._page_size - 1)
+
+    def _notify_rows_changed(self, first_row, last_row):
+        for view_model in list(self._views):
+            view_model._on_rows_changed(first_row, last_row)
+
+    def _on_pages_fetched(self, generation, first_page, page_count, rows):
+        if generation != self._generation:
+            return  # the cache was reset or invalidated after the request
+        page_size = self._page_size
+        changed_rows = None
+        for page_no in range(first_page, first_page + page_count):
+            self._pending_pages.pop(page_no, None)
+            if rows is None:
+                continue  # the fetching failed - the traceback was logged
+            offset = (page_no - first_page) * page_size
+            page_rows = rows[offset:offset + page_size]
+            if self._fetching_more and page_no * page_size == self._row_count:
+                # the page right after the loaded rows
+                if len(page_rows) < page_size:
+                    self._fetching_more = False  # the last page
+                    self._row_count_exact = True
+                self._set_row_count(self._row_count + len(page_rows))
+            changed = self._store_page(page_no, page_rows)
+            if changed:
+                changed_rows = changed if changed_rows is None \
+                    else (changed_rows[0], changed[1])
+        if changed_rows:
+            self._notify_rows_changed(*changed_rows)
+
+    def _store_page(self, page_no, rows):
+        """Put a fetched page into the cache.
+
+        Returns:
+            tuple: (first_row, last_row) which have changed or None
+        """
+        old_rows = self._cache.peek(page_no) if page_no in self._stale_pages else None
+        self._stale_pages.discard(page_no)
+        rows = Page(rows)
+        self._cache.put(page_no, rows)
+        first_row = page_no * self._page_size
+        if old_rows is None or old_rows.deferred_values:
+            # the deferred values may have changed too - they are fetched again when needed
+            return first_row, first_row + self._page_size - 1
+        # report only the rows which were changed
+        changed_rows = [
+            row_offset for row_offset in range(max(len(rows), len(old_rows)))
+            if row_offset >= len(rows) or row_offset >= len(old_rows)
+            or rows[row_offset] != old_rows[row_offset]]
+        # the display strings of the unchanged rows are still valid
+        changed_offsets = set(changed_rows)
+        rows.display_strings = {
+            key: value for key, value in old_rows.display_strings.items()
+            if key[0] not in changed_offsets}
+        if changed_rows:
+            return first_row + changed_rows[0], first_row + changed_rows[-1]
+
+    def _make_page_query(self, first_page, page_count=1):
+        """Make the query for fetching the rows of the given run of pages.
+
+        When a neighbour page is in the cache, seek from its boundary row, so the cost of the query
+        does not depend on how deep the pages are. Otherwise fall back to OFFSET, counting from the
+        end of the ordering which is closer to the pages.
+
+        Returns:
+            tuple: (query, reverse) - whether the fetched rows must be reversed
+        """
+        limit = self._page_size * page_count
+        query = self.catalog_model.select(*self._selection).where(self.where)
+        sort_key = self.sort_key
+
+        # the boundaries of outdated pages are not reliable
+        stale_pages = self._stale_pages
+        prev_page_no = first_page - 1
+        next_page_no = first_page + page_count
+        prev_page = self._cache.peek(prev_page_no) if prev_page_no not in stale_pages else None
+        next_page = self._cache.peek(next_page_no) if next_page_no not in stale_pages else None
+        if prev_page:
+            last_row = prev_page[-1]
+            query = query.where(seek_condition(sort_key, get_sort_key(last_row, sort_key)))
+            return query.order_by(*order_clause(sort_key)).limit(limit), False
+        if next_page:
+            first_row = next_page[0]
+            query = query.where(seek_condition(
+                sort_key, get_sort_key(first_row, sort_key), forward=False))
+            return query.order_by(*order_clause(sort_key, reverse=True)).limit(limit), True
+
+        offset = first_page * self._page_size
+        row_count = self.row_count()
+        # an estimated count can't be used for counting from the end
+        if self._row_count_exact and offset * 2 > row_count:
+            # the pages are in the second half - it's cheaper to skip the rows from the end
+            limit = max(min(limit, row_count - offset), 0)
+            offset = max(row_count - offset - limit, 0)
+            query = query.order_by(*order_clause(sort_key, reverse=True))
+            return query.offset(offset).limit(limit), True
+        return query.order_by(*order_clause(sort_key)).offset(offset).limit(limit), False
+
+    def row_count(self):
+        """Get the number of rows. If it's not known yet, the rows are counted in background and
+        an estimate is returned for now.
+        """
+        row_count = self._row_count
+        if row_count is None:
+            row_count = self._row_count = self._estimate_row_count()
+            self._request_row_count()
+        return row_count
+
+    def suggest_row_count(self, row_count):
+        """Use the exact row count known from another query with the same filter (e.g. before the
+        order was changed), if the count is not known yet.
+        """
+        if self._row_count is None:
+            self._row_count = row_count
+            self._row_count_exact = True
+
+    def _estimate_row_count(self):
+        """Get a cheap estimate of the row count, to use until the exact count arrives.
+
+        For an unfiltered catalog the table statistics are used. If there is no estimate, the
+        rows are added as they are fetched (see `fetching_more`).
+        """
+        if self.where is None:
+            row_count = estimate_row_count(self.catalog_model)
+            if row_count is not None:
+                return row_count
+        self._fetching_more = True
+        return 0
+
+    def _request_row_count(self):
+        """Start counting the rows in a worker thread.
+        """
+        generation = self._generation
+        scheduler.submit(
+            DbTask(self.catalog_model.select().where(self.where).count,
+                   self._rowsCounted, generation, token=self._make_token('counting rows')),
+            COUNT, lambda: generation == self._generation)
+
+    def _on_rows_counted(self, generation, row_count):
+        if generation != self._generation or row_count is None:
+            return
+        self._fetching_more = False
+        self._row_count_exact = True
+        self._set_row_count(row_count)
+
+    def _set_row_count(self, row_count):
+        """Change the row count, drop the cached pages which are beyond it and notify the views.
+        """
+        old_row_count = self._row_count
+        self._row_count = row_count
+        if row_count < old_row_count:
+            for page_no in self._cache.pages():
+                if page_no * self._page_size >= row_count:
+                    self._cache.pop(page_no)
+                    self._stale_pages.discard(page_no)
+        if row_count != old_row_count:
+            for view_model in list(self._views):
+                view_model._on_row_count_changed(row_count)
+
+    def is_row_count_exact(self):
+        return self._row_count_exact
+
+    def fetching_more(self):
+        """Whether there is no estimate of the row count, so the rows are added as the pages
+        after the loaded rows are fetched.
+        """
+        return self._fetching_more
+
+    def cache_stats(self):
+        """Get the statistics of the page cache: pages, rows, bytes, hits, misses, evictions.
+        """
+        return self._cache.stats()
+
+
+class ResidentRows(CatalogRows):
+    """Rows of a query of a resident catalog (see `ResidentTable`). The rows are filtered (also by
+    the quick filter text), sorted and counted in memory, and the pages are made at once from the
+    rows of the table, so nothing is fetched in background.
+
+    When a change of the table is reported, the table is loaded again, if its change counter
+    shows it was modified, and the views are notified only about the rows which changed.
+    """
+    def __init__(self, catalog_model, where, sort_key, table, search_fields=(), filter_text='',
+                 deferred_fields=()):
+        """
+        Args:
+            catalog_model: CatalogModel subclass whose items to show
+            where: peewee expression to filter the items or None
+            sort_key: the rows order, see `make_sort_key`
+            table (ResidentTable): the rows of the catalog
+            search_fields: the fields in which the words of the quick filter text are looked for
+            filter_text: the quick filter text
+            deferred_fields: the large fields to fetch per row, when a view needs them
+        """
+        table.validate()  # the table might have been modified while no rows were using it
+        self.table = table
+        self.search_fields = tuple(search_fields)
+        self.filter_text = filter_text
+        self._positions = None  # of the rows in the table, in the rows order
+        self._table_version = None  # of the table the positions were got from
+        super().__init__(catalog_model, where, sort_key, None, deferred_fields)
+        self.key = make_resident_rows_key(self.key, search_fields, filter_text)
+
+    def _update_positions(self):
+        """Filter and sort the rows of the table, loading them first, if they were never loaded.
+        """
+        table = self.table
+        table.ensure_loaded()
+        positions = table.filter(self.where, self.search_fields, self.filter_text)
+        table.sort(positions, self.sort_key)
+        self._positions = positions
+        self._table_version = table.version
+
+    def reset(self):
+        super().reset()
+        self._positions = None
+
+    def _invalidate(self, is_affected=None, recount=True):
+        """Load the table again, if it was modified, filter and sort the rows again and make the
+        cached pages again, notifying the views about the rows which changed.
+        """
+        self.table.validate()
+        self._update_positions()
+        self._used_pages.clear()
+        self._pending_pages = {}
+        self._resolving_pages = set()
+        self._fetching_deferred = set()
+        self._generation += 1
+        self._cancel_queries()
+        if self._row_count is not None:
+            self._set_row_count(len(self._positions))
+        changed_rows = None
+        for page_no in self._cache.pages():
+            self._stale_pages.add(page_no)
+            changed = self._store_page(page_no, self._make_page(page_no))
+            if changed:
+                changed_rows = changed if changed_rows is None \
+                    else (min(changed_rows[0], changed[0]), max(changed_rows[1], changed[1]))
+        if changed_rows:
+            self._notify_rows_changed(*changed_rows)
+
+    def apply_changes(self, model, operation, record_ids):
+        if model is self.catalog_model:
+            if self._positions is not None:
+                self._invalidate()
+        else:
+            super().apply_changes(model, operation, record_ids)
+
+    def _make_page(self, page_no):
+        rows = self.table.rows
+        first_row = page_no * self._page_size
+        return [rows[position]
+                for position in self._positions[first_row:first_row + self._page_size]]
+
+    def _check_table(self):
+        """Update the rows, if the table was loaded again by another query.
+        """
+        if self._positions is None:
+            self._update_positions()
+        elif self._table_version != self.table.version:
+            self._invalidate()
+
+    def get_row(self, row_no):
+        page_no, row_offset = divmod(row_no, self._page_size)
+        self.request_page(page_no)
+        rows = self._cache.get(page_no)
+        self._used_pages.add(page_no)
+        return rows[row_offset] if row_offset < len(rows) else None
+
+    def request_pages(self, first_page, page_count, priority=VISIBLE):
+        """Make the given pages, which are not cached yet, from the rows of the table.
+        """
+        self._check_table()
+        for page_no in range(first_page, first_page + page_count):
+            if page_no not in self._cache:
+                self._store_page(page_no, self._make_page(page_no))
+
+    def find_row(self, text, done, is_needed=None):
+        """Look up in memory the first row whose value of the first sort key field starts with
+        the text (see `get_prefix_variants`) and call `done` with the text and its number.
+        """
+        self._check_table()
+        field_names = self.catalog_model._meta.sorted_field_names
+        values = self.table.columns[field_names.index(self.sort_key[0][0].name)]
+        for prefix in get_prefix_variants(text):
+            for row_no, position in enumerate(self._positions):
+                value = values[position]
+                if value is not None and value.startswith(prefix):
+                    done(text, row_no)
+                    return
+        done(text, None)
+
+    def row_count(self):
+        if self._positions is None:
+            self._update_positions()
+        if self._row_count is None:
+            self._row_count = len(self._positions)
+            self._row_count_exact = True
+        return self._row_count
+
+
+class ChangeFeed():
+    """Polls the change logs of the databases (see `wic.db.install_change_log`) and routes the
+    changes to all the shared catalog rows. `PRAGMA data_version` tells cheaply whether another
+    process (or connection) committed something, and only then the new log entries are read, so
+    the cost of keeping the views up to date is proportional to the number of changes, not to
+    the size of the catalogs. The changes made by this process are read when they are reported
+    (see `wic.db.add_change_listener`).
+    """
+    _poll_period = 1  # seconds
+    _timer = None
+
+    @classmethod
+    def start(cls):
+        """Start polling, if it's not started yet. Must be called from the GUI thread.
+        """
+        if cls._timer is None:
+            cls._timer = QtCore.QTimer()
+            cls._timer.timeout.connect(cls.poll)
+            cls._timer.start(cls._poll_period * 1000)
+
+    @classmethod
+    def poll(cls, force=False):
+        """Read the new changes and apply them.
+
+        Args:
+            force (bool): read the log even if no other connection committed changes
+        """
+        for reader in get_change_log_readers():
+            try:
+                if not reader.is_changed() and not force:
+                    continue
+                changes = reader.read()
+            except peewee.DatabaseError:
+                logging.exception('Could not read the change log')
+                continue
+            for model, operation, record_ids in changes:
+                for rows in list(_shared_rows.values()):
+                    rows.apply_changes(model, operation, record_ids)
+
+
+_shared_rows = {}  # {key: CatalogRows}
+
+
+def make_rows_key(catalog_model, where, sort_key, fields=None, deferred_fields=()):
+    """Make the registry key of a query. Peewee expressions overload `==`, so they can't be
+    dict keys - the SQL of the query is used instead.
+    """
+    selection = make_selection(catalog_model, fields, sort_key) or ()
+    sql, params = catalog_model.select(*selection).where(where).order_by(
+        *order_clause(sort_key)).sql()
+    return catalog_model, sql, tuple(params), tuple(field.name for field in deferred_fields)
+
+
+def make_resident_rows_key(key, search_fields, filter_text):
+    """Make the registry key of a query of a resident catalog from the key of the query.
+    """
+    return key + (tuple(field.name for field in search_fields), filter_text)
+
+
+def get_catalog_rows(catalog_model, where=None, sort_key=None, fields=None, deferred_fields=(),
+                     search_fields=(), filter_text=''):
+    """Get the rows of the query shared by all its views, creating them if there are none yet.
+
+    Args:
+        catalog_model: CatalogModel subclass whose items to fetch
+        where: optional peewee expression to filter the items
+        sort_key: the rows order, see `make_sort_key`; by the primary key if not given
+        fields: the fields to fetch with the pages or None for all the fields
+        deferred_fields: the large fields to fetch per row, when a view needs them
+        search_fields: the fields in which the words of the quick filter text are looked for;
+            only for the resident catalogs (see `ResidentRows`)
+        filter_text: the quick filter text, only for the resident catalogs
+
+    Returns:
+        CatalogRows: the shared rows
+    """
+    if sort_key is None:
+        sort_key = make_sort_key(catalog_model)
+    table = get_resident_table(catalog_model)
+    if table is not None:
+        fields = None  # all the fields are in memory anyway
+    key = make_rows_key(catalog_model, where, sort_key, fields, deferred_fields)
+    if table is not None:
+        key = make_resident_rows_key(key, search_fields, filter_text)
+    rows = _shared_rows.get(key)
+    if rows is None:
+        if table is not None:
+            rows = ResidentRows(
+                catalog_model, where, sort_key, table, search_fields, filter_text,
+                deferred_fields)
+        else:
+            rows = CatalogRows(catalog_model, where, sort_key, fields, deferred_fields)
+        _shared_rows[key] = rows
+    return rows
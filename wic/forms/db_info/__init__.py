@@ -1,12 +1,84 @@
-import os, sys
+import functools, os, sys
 from PyQt5 import QtCore, QtGui, QtWidgets
+import peewee
 
-from wic import forms
+from wic import db, forms
+from wic.forms.catalog.catalog_view_model import get_catalog_models
+from wic.scheduler import DbTask, scheduler, MAINTENANCE
+
+
+def create_suggested_index(suggestion):
+    """Create the suggested index in a worker thread.
+
+    Returns:
+        str: the error message, empty if the index was created
+    """
+    try:
+        suggestion.apply()
+    except peewee.DatabaseError as exc:
+        return str(exc) or exc.__class__.__name__
+    return ''
 
 
 class Form(forms.Form):
     """"""
 
+    # suggestion, error message (see `create_suggested_index`) or None
+    _indexCreated = QtCore.pyqtSignal(object, object)
+
+    def on_open(self):
+        self._creating_index = False
+        self._indexCreated.connect(self.on_index_created)
+        self.refresh_index_suggestions()
+
+    def refresh_index_suggestions(self):
+        """Show the indexes which would speed up the slow queries of the catalogs.
+        """
+        self._index_suggestions = db.get_index_suggestions(get_catalog_models())
+        table = self.indexSuggestions
+        table.setRowCount(len(self._index_suggestions))
+        for row, suggestion in enumerate(self._index_suggestions):
+            max_duration = max(query.max_duration for query in suggestion.slow_queries)
+            values = (
+                suggestion.model.__name__,
+                sum(query.count for query in suggestion.slow_queries),
+                f'{max_duration * 1000:.0f}', suggestion.sql)
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(str(value))
+                item.setToolTip('\n\n'.join(query.sql for query in suggestion.slow_queries))
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+        self.buttonApplyIndex.setEnabled(bool(self._index_suggestions) and not self._creating_index)
+
+    @QtCore.pyqtSlot()
+    def on_buttonRefreshSuggestions_clicked(self):
+        self.refresh_index_suggestions()
+
+    @QtCore.pyqtSlot()
+    def on_buttonApplyIndex_clicked(self):
+        row = self.indexSuggestions.currentRow()
+        if row < 0:
+            self.show_information('Apply index', 'Select the index to create.')
+            return
+        suggestion = self._index_suggestions[row]
+        # may take a while on a big table
+        self._creating_index = True
+        self.buttonApplyIndex.setEnabled(False)
+        print(f'Creating index: {suggestion.sql}')
+        scheduler.submit(DbTask(
+            functools.partial(create_suggested_index, suggestion), self._indexCreated, suggestion),
+            MAINTENANCE)
+
+    def on_index_created(self, suggestion, error):
+        self._creating_index = False
+        if error is None:
+            error = 'See the log for details.'
+        if error:
+            self.show_warning('Failure', f'<b>Could not create the index</b><br>{error}')
+        else:
+            print(f'Index created: {suggestion.sql}')
+        self.refresh_index_suggestions()
+
     @QtCore.pyqtSlot()
     def on_buttonTestConnection_clicked(self):
         dbUri = self._.dbUri
@@ -29,6 +101,3 @@ class Form(forms.Form):
         #self.setWindowIcon(QtGui.QIcon(self._iconPath))
         #self.setWindowIcon(QtGui.QIcon(":/icons/calculator.png"))    
 
-
-
-
@@ -0,0 +1,135 @@
+from PyQt5 import QtCore, QtWidgets
+
+from wic import db, forms, menus, scheduler
+
+
+class Form(forms.Form):
+    """Statistics of the queries recorded by the query tracer (see `wic.db.QueryTracer`): the
+    queries which took the most time in total and the most frequent ones, and the statistics of
+    the priority classes of the DB scheduler (see `wic.scheduler.DbScheduler`).
+    """
+    _ui_file_path = None
+    _form_title = 'Query profiler'
+    _icon_path = ':/icons/fugue/clock-history.png'
+    _top_count = 50  # number of queries shown in each table
+
+    _columns = ('Total, ms', 'Count', 'Average, ms', 'Max, ms', 'Rows', 'Origins', 'SQL')
+    _scheduler_columns = (
+        'Class', 'Queued', 'Running', 'Submitted', 'Run', 'Dropped', 'Max queue',
+        'Average wait, ms', 'Max wait, ms')
+
+    def setupUi(self):
+        self.create_widgets()
+        super().setupUi()
+        self.refresh()
+
+    def create_widgets(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setSpacing(2)
+
+        toolbar = QtWidgets.QToolBar()
+        toolbar.setIconSize(QtCore.QSize(16, 16))
+        menus.add_actions_to_menu(
+            toolbar,
+            menus.create_action(
+                toolbar, 'Refresh', self.refresh, 'F5', ':/icons/fugue/arrow-circle-double.png'),
+            menus.create_action(
+                toolbar, 'Clear', self.clear, None, ':/icons/fugue/eraser.png',
+                tip='Forget the recorded queries'),
+            menus.create_action(
+                toolbar, 'Export…', self.export, None, ':/icons/fugue/database-export.png',
+                tip='Save the recorded queries into a JSON lines file'))
+        self.enabled_check_box = QtWidgets.QCheckBox('Record queries')
+        self.enabled_check_box.setChecked(db.query_tracer.enabled)
+        self.enabled_check_box.toggled.connect(self.set_tracing_enabled)
+        toolbar.addWidget(self.enabled_check_box)
+        layout.addWidget(toolbar)
+
+        self.tab_widget = QtWidgets.QTabWidget()
+        self.by_total_table = self.create_table()
+        self.tab_widget.addTab(self.by_total_table, 'By total time')
+        self.by_count_table = self.create_table()
+        self.tab_widget.addTab(self.by_count_table, 'By count')
+        self.scheduler_table = self.create_table(self._scheduler_columns)
+        self.tab_widget.addTab(self.scheduler_table, 'Scheduler')
+        layout.addWidget(self.tab_widget)
+
+        self.summary_label = QtWidgets.QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        layout.addWidget(self.button_box)
+
+    def create_table(self, columns=_columns):
+        table = QtWidgets.QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        table.setWordWrap(False)
+        table.verticalHeader().setDefaultSectionSize(20)
+        table.horizontalHeader().setStretchLastSection(True)
+        return table
+
+    def refresh(self):
+        stats = db.query_tracer.get_stats()
+        self.fill_table(
+            self.by_total_table, sorted(stats, key=lambda stat: stat['total'], reverse=True))
+        self.fill_table(
+            self.by_count_table, sorted(stats, key=lambda stat: stat['count'], reverse=True))
+        count = sum(stat['count'] for stat in stats)
+        total = sum(stat['total'] for stat in stats)
+        self.summary_label.setText(
+            f'{count} queries ({len(stats)} distinct) took {total * 1000:,.1f} ms')
+        self.fill_scheduler_table()
+
+    def fill_table(self, table, stats):
+        rows = []
+        for stat in stats[:self._top_count]:
+            origins = ', '.join(sorted(stat['origins'] | stat['models']))
+            rows.append((
+                stat['total'] * 1000, stat['count'], stat['total'] * 1000 / stat['count'],
+                stat['max'] * 1000, stat['rows'], origins, stat['sql']))
+        self.set_table_rows(table, rows)
+
+    def fill_scheduler_table(self):
+        rows = [
+            (name, stat['queued'], stat['running'], stat['submitted'], stat['run'],
+             stat['dropped'], stat['max_depth'], stat['average_wait'] * 1000,
+             stat['max_wait'] * 1000)
+            for name, stat in scheduler.scheduler.stats().items()]
+        self.set_table_rows(self.scheduler_table, rows)
+
+    def set_table_rows(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                if isinstance(value, float):
+                    text = f'{value:,.2f}'
+                elif isinstance(value, int):
+                    text = f'{value:,}'
+                else:
+                    text = value
+                item = QtWidgets.QTableWidgetItem(text)
+                if not isinstance(value, str):
+                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                else:
+                    item.setToolTip(value)
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+
+    def clear(self):
+        db.query_tracer.clear()
+        self.refresh()
+
+    def set_tracing_enabled(self, enabled):
+        db.query_tracer.enabled = enabled
+
+    def export(self):
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Export queries', 'queries.jsonl', 'JSON lines (*.jsonl);;All files (*)')
+        if not file_path:
+            return
+        try:
+            db.query_tracer.export(file_path)
+        except OSError as exc:
+            self.show_warning('Export failed', str(exc))
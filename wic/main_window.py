@@ -44,6 +44,18 @@ class MainWindow(QtWidgets.QMainWindow):
         tab_bar.installEventFilter(tab_bar_event_filter)
 
         self.statusBar() # create status bar
+        # aborts the running database queries, see `db.CancellationToken`
+        self.cancel_button = QtWidgets.QToolButton()
+        self.cancel_button.setIcon(QtGui.QIcon(':/icons/fugue/cross-octagon.png'))
+        self.cancel_button.setText('Cancel')
+        self.cancel_button.setToolButtonStyle(QtCore.Qt.ToolButtonTextBesideIcon)
+        self.cancel_button.setAutoRaise(True)
+        self.cancel_button.clicked.connect(self.cancel_queries)
+        self.cancel_button.hide()
+        self.statusBar().addPermanentWidget(self.cancel_button)
+        self._running_queries_timer = QtCore.QTimer(self)
+        self._running_queries_timer.timeout.connect(self.update_cancel_button)
+        self._running_queries_timer.start(300)
 
         self.messagesWindow = messages_window.MessagesWindow(self)
         self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.messagesWindow)
@@ -68,8 +80,26 @@ class MainWindow(QtWidgets.QMainWindow):
     def onSubwindowActivated(self, subWindow): # http://doc.trolltech.com/latest/qmdiarea.html#subWindowActivated
         #self.mdiArea.setActiveSubWindow(subWindow)
         saveActive = bool(subWindow and subWindow.isWindowModified())
+        if subWindow is not None:
+            # the queries are done mostly for the active form
+            db.query_origin.set(subWindow.windowTitle())
         #self.fileSaveAction.setEnabled(saveActive)
 
+    def update_cancel_button(self):
+        """Show the cancel button while there are database queries running.
+        """
+        tokens = db.get_running_tokens()
+        self.cancel_button.setVisible(bool(tokens))
+        if tokens:
+            self.cancel_button.setToolTip('Cancel:\n' + '\n'.join(
+                token.description for token in tokens))
+
+    def cancel_queries(self):
+        """Abort the running database queries.
+        """
+        for token in db.get_running_tokens():
+            token.cancel()
+
     def onTabBarLeftDblClick(self):
         sub_window = self.mdi_area.currentSubWindow()
         if sub_window.isMaximized():
@@ -173,6 +203,7 @@ class MessagesOut():
         sys.__stdout__.flush()
 
 
+from wic import db
 from wic import messages_window
 from wic import settings
 from wic import forms
@@ -34,6 +34,9 @@ class MainMenu():
             None,
             create_action(main_window, 'Database…', self.edit_db_info, None,
                           icon=':/icons/fugue/database.png', tip='Database connection'),
+            create_action(main_window, 'Query profiler', self.show_query_profiler, None,
+                          icon=':/icons/fugue/clock-history.png',
+                          tip='Statistics of the executed database queries'),
             create_action(main_window, 'Qt Designer', self.openQtDesigner, None,
                           icon=':/icons/fugue/application-form.png',
                           tip='Run Designer with custom widgets'),
@@ -131,6 +134,10 @@ class MainMenu():
         from wic.forms import open_form, db_info
         open_form(db_info.Form)
 
+    def show_query_profiler(self):
+        from wic.forms import open_form, query_profiler
+        open_form(query_profiler.Form)
+
     def help_about(self):
         from wic.forms import open_form, help_about
         open_form(help_about.Form, modal=True)
@@ -0,0 +1,237 @@
+"""
+Scheduling of the database work done in worker threads.
+"""
+import collections
+import contextlib
+import contextvars
+import logging
+import time
+
+from PyQt5 import QtCore
+
+from wic.db import release_connection, QueryCancelled
+
+
+class DbTask(QtCore.QRunnable):
+    """Runs a function querying the DB in a worker thread and emits a signal with its result.
+    """
+    def __init__(self, function, done, *args, token=None):
+        """
+        Args:
+            function: function to call without arguments
+            done: bound signal to emit with `args` and the function result when done; the result
+                is None, if the function failed, was cancelled or dropped
+            token (Optional[CancellationToken]): token to abort the queries of the function
+        """
+        super().__init__()
+        self.function = function
+        self.done = done
+        self.args = args
+        self.token = token
+        self.context = contextvars.copy_context()  # e.g. the origin of the traced queries
+
+    def run(self):
+        try:
+            with self.token or contextlib.nullcontext():
+                result = self.context.run(self.function)
+        except QueryCancelled as exc:
+            logging.info('DB task %s was aborted: %s', self.function, exc)
+            result = None
+        except Exception:
+            # not printing - stdout is hooked by the messages window, which lives in GUI thread
+            logging.exception('DB task %s failed', self.function)
+            result = None
+        finally:
+            release_connection()  # a pool thread might not run a DB task for a long time
+        self._emit_done(result)
+
+    def drop(self):
+        """Report that there is no result without running the function, e.g. when the result is
+        not needed anymore.
+        """
+        self._emit_done(None)
+
+    def _emit_done(self, result):
+        try:
+            self.done.emit(*self.args, result)
+        except RuntimeError:
+            pass  # the receiver was deleted in the meantime
+
+
+# priority classes of the database work, the most urgent first
+VISIBLE = 0  # the rows the user is looking at
+SELECTION = 1  # the items the user selected or opened
+PREFETCH = 2  # the rows the user is expected to scroll to
+COUNT = 3  # row counts
+REFRESH = 4  # refetching the changed rows, which are not shown
+REPORT = 5  # reports and searches
+MAINTENANCE = 6  # building indexes
+PRIORITY_NAMES = (
+    'visible', 'selection', 'prefetch', 'count', 'refresh', 'report', 'maintenance')
+
+
+class DbRequest():
+    """A task submitted to `DbScheduler`.
+    """
+    def __init__(self, task, priority, is_needed):
+        self.task = task
+        self.priority = priority
+        self.is_needed = is_needed
+        self.submit_time = time.monotonic()
+        self.state = 'queued'  # 'running', 'done' or 'dropped'
+
+    def cancel(self):
+        """Drop the task, if it's still queued, or abort its queries, if it's running.
+        """
+        if self.state == 'queued':
+            self.is_needed = lambda: False  # dropped when its turn comes
+        elif self.state == 'running' and self.task.token is not None:
+            self.task.token.cancel()
+
+
+class _ScheduledTask(QtCore.QRunnable):
+
+    def __init__(self, scheduler, request):
+        super().__init__()
+        self.scheduler = scheduler
+        self.request = request
+
+    def run(self):
+        try:
+            self.request.task.run()
+        finally:
+            self.scheduler._taskFinished.emit(self.request)
+
+
+class DbScheduler(QtCore.QObject):
+    """Runs DB tasks in a thread pool in the order of their priority classes, so the rows the user
+    is looking at don't wait behind a prefetch or a slow count.
+
+    A class may have a limit of its tasks running at the same time, and the classes after
+    `SELECTION` don't take the last `_reserved_threads` threads of the pool, unless it's idle.
+    A queued request may be superseded (e.g. its page was scrolled out of view): `is_needed` is
+    checked right before it's run, and if it's false the task is dropped. Must be used from the
+    GUI thread.
+    """
+    _reserved_threads = 1  # threads kept for the visible rows and the selection
+    # priority class: maximum number of its tasks running at the same time
+    _default_limits = {PREFETCH: 2, COUNT: 1, REFRESH: 1, REPORT: 1, MAINTENANCE: 1}
+    # request - emitted from a worker thread
+    _taskFinished = QtCore.pyqtSignal(object)
+
+    def __init__(self, thread_pool=None, limits=None):
+        """
+        Args:
+            thread_pool (Optional[QThreadPool]): the pool to run the tasks in, the global one by
+                default
+            limits (Optional[dict]): overrides of `_default_limits`
+        """
+        super().__init__(None)  # no parent
+        self._thread_pool = thread_pool or QtCore.QThreadPool.globalInstance()
+        self.limits = {**self._default_limits, **(limits or {})}
+        self._queues = [collections.deque() for _ in PRIORITY_NAMES]
+        self._running = [0] * len(PRIORITY_NAMES)
+        self._stats = [
+            dict(submitted=0, run=0, dropped=0, max_depth=0, wait=0, max_wait=0)
+            for _ in PRIORITY_NAMES]
+        self._taskFinished.connect(self._on_task_finished)
+
+    def submit(self, task, priority, is_needed=None):
+        """Queue a task.
+
+        Args:
+            task (DbTask): the task
+            priority (int): its priority class, e.g. `VISIBLE`
+            is_needed: function telling whether the task must still be run
+
+        Returns:
+            DbRequest: the request, which can be cancelled or promoted
+        """
+        request = DbRequest(task, priority, is_needed)
+        self._enqueue(request)
+        self._stats[priority]['submitted'] += 1
+        self._dispatch()
+        return request
+
+    def promote(self, request, priority):
+        """Move a queued request to a more urgent priority class, e.g. when a prefetched page
+        became visible.
+        """
+        if request.state != 'queued' or priority >= request.priority:
+            return
+        try:
+            self._queues[request.priority].remove(request)
+        except ValueError:
+            return
+        request.priority = priority
+        self._enqueue(request)
+        self._dispatch()
+
+    def _enqueue(self, request):
+        queue = self._queues[request.priority]
+        queue.append(request)
+        stats = self._stats[request.priority]
+        stats['max_depth'] = max(stats['max_depth'], len(queue))
+
+    def _dispatch(self):
+        max_threads = self._thread_pool.maxThreadCount()
+        # an idle pool runs background work even if it has no more threads than reserved
+        max_background = max(max_threads - self._reserved_threads, 1)
+        while True:
+            running = sum(self._running)
+            if running >= max_threads:
+                return
+            request = self._take_next(running < max_background)
+            if request is None:
+                return
+            request.state = 'running'
+            wait = time.monotonic() - request.submit_time
+            stats = self._stats[request.priority]
+            stats['run'] += 1
+            stats['wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+            self._running[request.priority] += 1
+            self._thread_pool.start(_ScheduledTask(self, request))
+
+    def _take_next(self, background_allowed):
+        """Get the most urgent request which may run now, dropping the superseded ones.
+        """
+        for priority, queue in enumerate(self._queues):
+            if priority > SELECTION and not background_allowed:
+                return None
+            limit = self.limits.get(priority)
+            if limit is not None and self._running[priority] >= limit:
+                continue
+            while queue:
+                request = queue.popleft()
+                if request.is_needed is None or request.is_needed():
+                    return request
+                request.state = 'dropped'
+                self._stats[priority]['dropped'] += 1
+                request.task.drop()
+        return None
+
+    def _on_task_finished(self, request):
+        request.state = 'done'
+        self._running[request.priority] -= 1
+        self._dispatch()
+
+    def stats(self):
+        """Get the statistics of the priority classes.
+
+        Returns:
+            dict: {class name: dict(queued, running, submitted, run, dropped, max_depth,
+                average_wait, max_wait)}, the wait times are in seconds
+        """
+        stats = {}
+        for priority, name in enumerate(PRIORITY_NAMES):
+            class_stats = dict(self._stats[priority])
+            wait = class_stats.pop('wait')
+            class_stats.update(
+                queued=len(self._queues[priority]), running=self._running[priority],
+                average_wait=wait / class_stats['run'] if class_stats['run'] else 0)
+            stats[name] = class_stats
+        return stats
+
+
+scheduler = DbScheduler()
@@ -1,5 +1,7 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 
+from wic import db
+
 
 class Settings():
     def __init__(self, main_window):
@@ -27,6 +29,9 @@ class Settings():
             self.recent_files = []
 
         self.last_used_dir = self.settings.value('lastUsedDirectory', '')
+
+        # database connection settings, the defaults are not saved, so they can be changed
+        self.database = read_database_settings(self.settings)
         #self.settings.endGroup()
 
     def save(self):
@@ -35,3 +40,24 @@ class Settings():
         self.settings.setValue('showMessagesWindow', int(self.main_window.messagesWindow.isVisible()))
         self.settings.setValue('recentFiles', self.recent_files)
         self.settings.setValue('lastUsedDirectory', self.last_used_dir)
+
+
+def read_database_settings(settings):
+    """Read the overrides of `db.DATABASE_SETTINGS` from group `database` of the settings.
+
+    INI files keep the values as strings, so they are converted to the types of the defaults;
+    `bool('false')` is true, so the booleans are parsed.
+
+    Returns:
+        dict: {key: value} of the settings present in the file
+    """
+    database = {}
+    for key, default in db.DATABASE_SETTINGS.items():
+        value = settings.value(f'database/{key}', None)
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            database[key] = str(value).lower() in ('true', '1')
+        else:
+            database[key] = type(default)(value)
+    return database
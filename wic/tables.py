@@ -102,10 +102,12 @@ class TableColumnProperties():
 
 class TableRow():
     # maybe subclass list instead of wrapping it?
-    __slots__ = ['_table', '_values']
+    __slots__ = ['_table', '_values', '_display_strings']
     def __init__(self, table, from_row=None):
         self._table = table
         self._values = from_row._values[:] if from_row else []
+        # {column index: (column format, formatted value)}, filled by TableModel
+        self._display_strings = {}
         for column in self._table.columns():
             self._values.append(column.row_item.default)
 
@@ -134,6 +136,7 @@ class TableRow():
     def __setitem__(self, key, value):
         column_index = self._table._columns_order[key] if isinstance(key, str) else key
         self._values[column_index] = value
+        self._display_strings.pop(column_index, None)
         if self._table._table_view:
             table_model = self._table._table_view.model()
             index = table_model.index(self.index(), column_index)
@@ -288,6 +291,7 @@ class Table():
 
         for row in self._rows:
             row._values.insert(index, None)
+            row._display_strings.clear()  # column indexes changed
 
         column.label = label or identifier  # column header label
         column.visible = visible
@@ -305,6 +309,7 @@ class Table():
         self._notify_table_view()
         for row in self._rows:
             del row._values[column_index]
+            row._display_strings.clear()  # column indexes changed
         self._notify_table_view(True)
 
     def delRows(self):
@@ -342,8 +347,19 @@ class TableModel(QtCore.QAbstractTableModel):
 
     def data(self, index, role):
         if index.isValid():
-            value = self.table.getValue(index.row(), index.column())
-            return self.table.column(index.column()).row_item.data(role, value)
+            column_index = index.column()
+            row = self.table.row(index.row())
+            if role == QtCore.Qt.DisplayRole:
+                # formatting dates and decimals on each repaint is costly - format once per edit
+                # or change of the column format
+                row_item = self.table.column(column_index).row_item
+                cached = row._display_strings.get(column_index)
+                if cached is not None and cached[0] == row_item.format:
+                    return cached[1]
+                value = row_item.data(role, row._values[column_index])
+                row._display_strings[column_index] = (row_item.format, value)
+                return value
+            return self.table.column(column_index).row_item.data(role, row._values[column_index])
 
     def setData(self, index, value, role = QtCore.Qt.EditRole):
         # editable model - data may be edited through an item delegate editor